@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from src.routes.profile import profile_router
 from src.routes.auth import auth_router
@@ -11,7 +13,29 @@ from prometheus_fastapi_instrumentator import Instrumentator
 from src.routes.livebot import live_bot
 from src.routes.websearch import web_search_router
 from src.routes.resume import resume_router
-app = FastAPI()
+from src.Chatbot.chat_def import checkpointer as chat_checkpointer
+from src.database import ensure_indexes, retry_ensure_indexes
+from src.Intelli_News.intelli_news_function import start_news_client, close_news_client
+from src.Intelli_News.news_cache import news_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A worker that starts while Mongo is down keeps retrying instead of running without indexes
+    index_task = None if await ensure_indexes() else asyncio.create_task(retry_ensure_indexes())
+    chat_checkpointer.start()
+    await start_news_client()
+    news_cache.start()
+    yield
+    if index_task is not None:
+        index_task.cancel()
+    await news_cache.stop()
+    await close_news_client()
+    # Write out any chat state still waiting for the next flush
+    await chat_checkpointer.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
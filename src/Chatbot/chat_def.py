@@ -2,25 +2,37 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uuid
 import os
+import asyncio
+import groq
 from typing import List, Dict, Optional
-from langchain_core.messages import HumanMessage,AIMessage
+from langchain_core.messages import HumanMessage,AIMessage,RemoveMessage
 from langchain_groq import ChatGroq
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.graph import START, MessagesState, StateGraph
+from langgraph.graph import START, END, MessagesState, StateGraph
+from langgraph.graph.state import CompiledStateGraph
 from datetime import datetime
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
 from src.profile.form import ChatRequest,ModelListResponse
 from dotenv import load_dotenv
-from src.database import chats_collection
+from src.database import chats_collection, chat_checkpoints_collection
 from src.Chatbot.prompt import CUSTOM_PROMPT
+from src.Chatbot.concurrency import ModelLimiter, ModelBusyError
+from src.Chatbot.mongo_checkpointer import MongoCheckpointSaver
+from src.Chatbot.response_cache import ResponseCache
+from src.Chatbot.instrumentation import LLMMetricsHandler
+from src.Chatbot.model_router import ModelRouter, ModelUnavailableError
+from src.metrics import LLM_RETRIES
+from src.Chatbot.context import SUMMARY_PROMPT, build_history, estimate_tokens, format_turns, turn_starts, window_start
+from logger import logger
 
-AVAILABLE_MODELS = [
-    "llama-3.3-70b-versatile",
-    "deepseek-r1-distill-qwen-32b",
-    "gemma2-9b-it"
-]
-memory_dict: Dict[str, MemorySaver] = {}
-graphs: Dict[str, StateGraph] = {}
+# Model name -> in-flight limit and how many requests may queue behind it
+AVAILABLE_MODELS = {
+    "llama-3.3-70b-versatile": {"max_concurrency": 8, "max_queue": 32},
+    "deepseek-r1-distill-qwen-32b": {"max_concurrency": 4, "max_queue": 16},
+    "gemma2-9b-it": {"max_concurrency": 8, "max_queue": 32},
+}
+# One compiled graph per model; conversation state lives in the shared checkpointer
+graphs: Dict[str, CompiledStateGraph] = {}
 
 load_dotenv()
 # Groq API Key from environment variable
@@ -28,27 +40,114 @@ api_key = os.getenv("GROQ_API_KEY")
 if not api_key:
     raise ValueError("Missing GROQ_API_KEY environment variable!")
 
-prompt_template = ChatPromptTemplate.from_template(CUSTOM_PROMPT)
-# Function to create a new AI graph session
-def create_graph(model_name: str, thread_id: str):
-    workflow = StateGraph(state_schema=MessagesState)
+# Seconds a request may wait for a free model slot before it is rejected
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))
+# Retries are done here rather than inside the Groq SDK so they can be counted
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+# APITimeoutError subclasses APIConnectionError but is not retried: a model that just used up
+# its whole timeout is handed to the router as a failure so the next model answers instead
+RETRYABLE_ERRORS = (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)
+
+# Routing across AVAILABLE_MODELS (in order): a model's circuit opens after
+# LLM_BREAKER_FAILURES consecutive failures for LLM_BREAKER_RESET seconds, and a
+# second copy of a call is sent once it runs past the model's rolling p95 latency
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+model_limiters: Dict[str, ModelLimiter] = {
+    name: ModelLimiter(name, limits["max_concurrency"], limits["max_queue"], LLM_QUEUE_TIMEOUT)
+    for name, limits in AVAILABLE_MODELS.items()
+}
 
-    model = ChatGroq(
+chat_models: Dict[str, ChatGroq] = {
+    name: ChatGroq(
         api_key=api_key,
-        model=model_name,
+        model=name,
         temperature=0,
         max_tokens=None,
         timeout=10,
-        max_retries=2,
+        max_retries=0,
+        callbacks=[LLMMetricsHandler("groq", name)],
     )
+    for name in AVAILABLE_MODELS
+}
+
+
+async def invoke_model(model_name: str, prompt, config: RunnableConfig) -> AIMessage:
+    """Call one model within its concurrency limit, retrying transient upstream errors."""
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with model_limiters[model_name].slot():
+                return await chat_models[model_name].ainvoke(prompt, config)
+        except groq.APITimeoutError:
+            raise
+        except RETRYABLE_ERRORS:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            LLM_RETRIES.labels("groq", model_name).inc()
+            await asyncio.sleep(LLM_RETRY_BACKOFF * 2 ** attempt)
+
+
+router = ModelRouter(
+    list(AVAILABLE_MODELS),
+    invoke_model,
+    has_capacity=lambda name: model_limiters[name].has_capacity(),
+    failure_threshold=LLM_BREAKER_FAILURES,
+    reset_timeout=LLM_BREAKER_RESET,
+    hedge=LLM_HEDGE_ENABLED,
+    min_samples=LLM_HEDGE_MIN_SAMPLES,
+)
+
+# Per-thread conversation state, bounded by thread count and idle time in memory
+# and flushed to MongoDB so any worker can continue a thread
+CHAT_MAX_THREADS = int(os.getenv("CHAT_MAX_THREADS", "1000"))
+CHAT_THREAD_IDLE_TTL = float(os.getenv("CHAT_THREAD_IDLE_TTL", "3600"))
+CHAT_CHECKPOINT_FLUSH_INTERVAL = float(os.getenv("CHAT_CHECKPOINT_FLUSH_INTERVAL", "1"))
+# How long a thread checked against Mongo is trusted before checking again for writes from other workers
+CHAT_CHECKPOINT_REFRESH_INTERVAL = float(os.getenv("CHAT_CHECKPOINT_REFRESH_INTERVAL", "2"))
+# Turns loaded from chats_collection for threads that have no stored checkpoint
+CHAT_REHYDRATE_TURNS = int(os.getenv("CHAT_REHYDRATE_TURNS", "20"))
+
+checkpointer = MongoCheckpointSaver(
+    chat_checkpoints_collection,
+    flush_interval=CHAT_CHECKPOINT_FLUSH_INTERVAL,
+    refresh_interval=CHAT_CHECKPOINT_REFRESH_INTERVAL,
+    max_threads=CHAT_MAX_THREADS,
+    idle_ttl=CHAT_THREAD_IDLE_TTL,
+)
+
+# Prompt history: at most CHAT_HISTORY_TOKEN_BUDGET tokens, with turns beyond the
+# last CHAT_HISTORY_TURNS folded into a rolling summary CHAT_SUMMARY_BATCH_TURNS at a time
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+CHAT_SUMMARY_BATCH_TURNS = int(os.getenv("CHAT_SUMMARY_BATCH_TURNS", "4"))
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "200"))
+
+
+# Opt-in cache of answers to prompts without conversation history
+CHAT_RESPONSE_CACHE_ENABLED = os.getenv("CHAT_RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+CHAT_RESPONSE_CACHE_SIZE = int(os.getenv("CHAT_RESPONSE_CACHE_SIZE", "2048"))
+CHAT_RESPONSE_CACHE_TTL = float(os.getenv("CHAT_RESPONSE_CACHE_TTL", "3600"))
 
-    def call_model(state: MessagesState):
-        history = ""
-        for msg in state["messages"][:-1]:
-            if isinstance(msg, HumanMessage):
-                history += f"User: {msg.content}\n"
-            elif isinstance(msg, AIMessage):
-                history += f"IntelliHelper: {msg.content}\n"
+response_cache = ResponseCache(CHAT_RESPONSE_CACHE_SIZE, CHAT_RESPONSE_CACHE_TTL) if CHAT_RESPONSE_CACHE_ENABLED else None
+
+
+class ChatState(MessagesState):
+    # Rolling summary of the turns that have been removed from messages
+    summary: str
+
+
+prompt_template = ChatPromptTemplate.from_template(CUSTOM_PROMPT)
+summary_template = ChatPromptTemplate.from_template(SUMMARY_PROMPT)
+# Function to build the AI graph that prefers a model
+def create_graph(model_name: str):
+    workflow = StateGraph(state_schema=ChatState)
+
+    async def call_model(state: ChatState, config: RunnableConfig):
+        history = build_history(state["messages"][:-1], state.get("summary", ""), CHAT_HISTORY_TOKEN_BUDGET)
 
         current_message = state["messages"][-1].content
         formatted_prompt = prompt_template.format_messages(
@@ -56,13 +155,122 @@ def create_graph(model_name: str, thread_id: str):
             context="",
             question=current_message
         )
-        response = model.invoke(formatted_prompt)
+        # Passing config through lets stream_mode="messages" receive the tokens.
+        response = await router.ainvoke(model_name, formatted_prompt, config)
         return {"messages": response}
 
     workflow.add_edge(START, "model")
     workflow.add_node("model", call_model)
+    workflow.add_edge("model", END)
+
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def needs_summary(messages) -> bool:
+    too_many_turns = len(turn_starts(messages)) > CHAT_HISTORY_TURNS + CHAT_SUMMARY_BATCH_TURNS
+    return too_many_turns or estimate_tokens(format_turns(messages)) > CHAT_HISTORY_TOKEN_BUDGET
+
+
+# Threads with a summary fold running, so each thread has at most one at a time
+summarizing_threads: set = set()
+summary_tasks: set = set()
+
+
+def state_key(user_id, thread_id: str) -> str:
+    """Checkpoint key of a user's thread; thread ids come from clients, so they are scoped to the user."""
+    return f"{user_id}:{thread_id}"
+
+
+async def summarize_thread(model_name: str, state_id: str):
+    """Fold a thread's older turns into its rolling summary once its history is over budget."""
+    graph = get_graph(model_name)
+    config = {"configurable": {"thread_id": state_id}}
+    state = (await graph.aget_state(config)).values
+    messages = state.get("messages", [])
+    if not needs_summary(messages):
+        return
+    # Fold down to half the budget so the next few turns do not trigger another fold;
+    # the latest turn is always kept
+    keep_from = min(window_start(messages, CHAT_HISTORY_TOKEN_BUDGET // 2, CHAT_HISTORY_TURNS), turn_starts(messages)[-1])
+    folded = messages[:keep_from]
+    if not folded:
+        return
+
+    formatted_prompt = summary_template.format_messages(
+        summary=state.get("summary") or "None yet.",
+        turns=format_turns(folded),
+        max_words=CHAT_SUMMARY_MAX_WORDS
+    )
+    response = await router.ainvoke(model_name, formatted_prompt, {"configurable": {"hedge": False}})
+    # Removing by id keeps any turn that was added while the summary was being written
+    await graph.aupdate_state(
+        config,
+        {"summary": response.content, "messages": [RemoveMessage(id=msg.id) for msg in folded]},
+        as_node="model"
+    )
+
+
+def schedule_summary(model_name: str, state_id: str):
+    """Update the thread's summary in the background, after its reply has been sent."""
+    if state_id in summarizing_threads:
+        return
+
+    async def run():
+        try:
+            await summarize_thread(model_name, state_id)
+        except Exception as e:
+            # The thread keeps its full history; the fold is retried after the next turn
+            logger.error(f"Chat summary update failed: {e}")
+        finally:
+            summarizing_threads.discard(state_id)
+
+    summarizing_threads.add(state_id)
+    task = asyncio.create_task(run())
+    summary_tasks.add(task)
+    task.add_done_callback(summary_tasks.discard)
+
+
+def get_graph(model_name: str) -> CompiledStateGraph:
+    """Return the compiled graph for a model, building it on first use."""
+    if model_name not in graphs:
+        graphs[model_name] = create_graph(model_name)
+    return graphs[model_name]
+
+
+async def rehydrate_thread(graph: CompiledStateGraph, thread_id: str, user_id) -> bool:
+    """Seed a thread that has no checkpoint from the turns stored in chats_collection.
+
+    Returns whether the thread has any conversation state afterwards.
+    """
+    config = {"configurable": {"thread_id": state_key(user_id, thread_id)}}
+    if await checkpointer.aget_tuple(config) is not None:
+        return True
+
+    turns = await chats_collection.find(
+        {"user_id": user_id, "thread_id": thread_id},
+        {"message": 1, "response": 1}
+    ).sort("timestamp", -1).limit(CHAT_REHYDRATE_TURNS).to_list(length=None)
+    if not turns:
+        return False
+
+    messages = []
+    for turn in reversed(turns):
+        messages.append(HumanMessage(content=turn["message"]))
+        messages.append(AIMessage(content=turn["response"]))
+    await graph.aupdate_state(config, {"messages": messages}, as_node="model")
+    return True
+
+
+async def record_cached_turn(graph: CompiledStateGraph, state_id: str, question: str, answer: str, model_name: str):
+    """Add a turn answered from the response cache to the thread state, as if the model had run."""
+    await graph.aupdate_state(
+        {"configurable": {"thread_id": state_id}},
+        {"messages": [HumanMessage(content=question), AIMessage(content=answer, response_metadata={"served_by": model_name})]},
+        as_node="model"
+    )
+
 
-    memory = MemorySaver()
-    memory_dict[thread_id] = memory
+async def delete_thread_state(state_id: str):
+    """Drop the conversation state of a thread from memory and MongoDB."""
+    await checkpointer.adelete_thread(state_id)
 
-    return workflow.compile(checkpointer=memory)
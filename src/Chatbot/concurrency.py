@@ -0,0 +1,46 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from src.metrics import LLM_IN_FLIGHT, LLM_QUEUE_DEPTH
+
+
+class ModelBusyError(Exception):
+    """Raised when a model has no free slot and its wait queue is full or timed out."""
+
+
+class ModelLimiter:
+    """Caps in-flight calls to a single model and bounds how many callers may wait."""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one in-flight slot, rejecting fast when the wait queue is already full."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            raise ModelBusyError(f"Model '{self.name}' is busy, try again shortly")
+
+        self.waiting += 1
+        LLM_QUEUE_DEPTH.labels(self.name).inc()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ModelBusyError(f"Model '{self.name}' is busy, try again shortly")
+        finally:
+            self.waiting -= 1
+            LLM_QUEUE_DEPTH.labels(self.name).dec()
+
+        LLM_IN_FLIGHT.labels(self.name).inc()
+        try:
+            yield
+        finally:
+            LLM_IN_FLIGHT.labels(self.name).dec()
+            self._semaphore.release()
+
+    def has_capacity(self) -> bool:
+        return not self._semaphore.locked()
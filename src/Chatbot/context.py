@@ -0,0 +1,68 @@
+from typing import List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+SUMMARY_PROMPT = """
+Update the running summary of a conversation between a user and IntelliHelper.
+Keep every fact, preference and open question the user may refer back to. Write at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns to fold in:
+{turns}
+
+Updated summary:
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for budgeting prompts."""
+    return len(text) // 4 + 1
+
+
+def format_message(msg: BaseMessage) -> str:
+    if isinstance(msg, HumanMessage):
+        return f"User: {msg.content}\n"
+    if isinstance(msg, AIMessage):
+        return f"IntelliHelper: {msg.content}\n"
+    return ""
+
+
+def turn_starts(messages: Sequence[BaseMessage]) -> List[int]:
+    """Indexes where a user turn begins."""
+    return [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+
+
+def window_start(messages: Sequence[BaseMessage], token_budget: int, max_turns: int = None) -> int:
+    """Index of the oldest message kept verbatim.
+
+    Whole turns are taken from the newest backwards until ``max_turns`` turns are
+    kept or the next turn would exceed ``token_budget``.
+    """
+    start = len(messages)
+    used = 0
+    kept_turns = 0
+    for turn_start in reversed(turn_starts(messages)):
+        if max_turns is not None and kept_turns >= max_turns:
+            break
+        cost = sum(estimate_tokens(format_message(msg)) for msg in messages[turn_start:start])
+        if used + cost > token_budget:
+            break
+        used += cost
+        kept_turns += 1
+        start = turn_start
+    return start
+
+
+def build_history(messages: Sequence[BaseMessage], summary: str, token_budget: int) -> str:
+    """Render the prompt history: the rolling summary followed by the newest turns that fit the budget."""
+    budget = token_budget - (estimate_tokens(summary) if summary else 0)
+    recent = messages[window_start(messages, budget):]
+    lines = [f"Summary of earlier conversation: {summary}\n"] if summary else []
+    lines.extend(format_message(msg) for msg in recent)
+    return "".join(lines)
+
+
+def format_turns(messages: Sequence[BaseMessage]) -> str:
+    return "".join(format_message(msg) for msg in messages)
@@ -0,0 +1,59 @@
+import asyncio
+import os
+from typing import Any, Dict
+from uuid import UUID
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from src.metrics import LLMCall
+
+load_dotenv()
+
+# Calls that never report back (cancelled mid-flight) are dropped after this long and counted as cancelled;
+# it only needs to outlast the slowest real call
+LLM_CALL_TRACKING_TTL = float(os.getenv("LLM_CALL_TRACKING_TTL", "120"))
+LLM_CALL_TRACKING_SIZE = int(os.getenv("LLM_CALL_TRACKING_SIZE", "4096"))
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """LangChain callback that feeds chat model calls into the LLM metrics."""
+
+    # Cheap bookkeeping only, so run on the event loop instead of an executor
+    run_inline = True
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self._calls: Dict[UUID, LLMCall] = TTLCache(maxsize=LLM_CALL_TRACKING_SIZE, ttl=LLM_CALL_TRACKING_TTL)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, **kwargs: Any):
+        for _, stale in self._calls.expire():
+            stale.finish(asyncio.CancelledError())
+        self._calls[run_id] = LLMCall(self.provider, self.model)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        call = self._calls.get(run_id)
+        if call is not None and token:
+            call.first_token()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        message = getattr(response.generations[0][0], "message", None) if response.generations else None
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            call.usage(usage.get("input_tokens"), usage.get("output_tokens"))
+        else:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            call.usage(token_usage.get("prompt_tokens"), token_usage.get("completion_tokens"))
+        call.finish()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        # A cancelled call reports CancelledError here when LangChain gets the chance; LLMCall counts it apart
+        call = self._calls.pop(run_id, None)
+        if call is not None:
+            call.finish(error)
@@ -0,0 +1,201 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import groq
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
+
+from logger import logger
+from src.Chatbot.concurrency import ModelBusyError
+from src.metrics import LLM_CIRCUIT_OPEN, LLM_FALLBACKS, LLM_HEDGES
+
+
+class ModelUnavailableError(Exception):
+    """Raised when every configured model is failing or has its circuit open."""
+
+
+def is_caller_error(error: BaseException) -> bool:
+    """True for 4xx errors caused by the request itself (e.g. a prompt over the context window).
+
+    Such errors say nothing about the model's health and would fail on any model,
+    so they neither trip a breaker nor trigger a fallback.
+    """
+    return isinstance(error, groq.APIStatusError) and 400 <= error.status_code < 500 \
+        and error.status_code not in (408, 409, 429)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and lets one trial call
+    through once ``reset_timeout`` seconds have passed."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._trial_in_flight or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def release_trial(self):
+        """Give back a half-open trial slot whose call neither succeeded nor failed upstream."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        LLM_CIRCUIT_OPEN.labels(self.name).set(0)
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit opened for model {self.name} after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            LLM_CIRCUIT_OPEN.labels(self.name).set(1)
+
+
+class LatencyWindow:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, size: int, min_samples: int):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+Invoker = Callable[[str, object, RunnableConfig], Awaitable[AIMessage]]
+
+
+class ModelRouter:
+    """Routes a prompt to the requested model, hedging slow calls and falling back
+    to the next configured model when it fails or its circuit is open.
+
+    The answering model is recorded in ``response_metadata["served_by"]``.
+    """
+
+    def __init__(
+        self,
+        models: List[str],
+        invoke: Invoker,
+        has_capacity: Callable[[str], bool],
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        hedge: bool = True,
+        latency_window: int = 200,
+        min_samples: int = 20,
+    ):
+        self.models = models
+        self.invoke = invoke
+        self.has_capacity = has_capacity
+        self.hedge = hedge
+        self.breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(name, failure_threshold, reset_timeout) for name in models
+        }
+        self.latency: Dict[str, LatencyWindow] = {name: LatencyWindow(latency_window, min_samples) for name in models}
+
+    async def ainvoke(self, preferred: str, prompt, config: RunnableConfig) -> AIMessage:
+        """Answer with ``preferred`` if it is healthy, otherwise with the next model that is."""
+        candidates = [preferred] + [name for name in self.models if name != preferred]
+        # Concurrent hedges would interleave their tokens on a streamed response
+        hedge = self.hedge and config.get("configurable", {}).get("hedge", True)
+        last_error: Optional[Exception] = None
+
+        for attempt, name in enumerate(candidates):
+            breaker = self.breakers[name]
+            if not breaker.allow():
+                continue
+            if last_error is not None:
+                LLM_FALLBACKS.labels(preferred, name).inc()
+                logger.warning(f"Falling back from {preferred} to {name}: {last_error}")
+            # Tagging the attempt lets streaming consumers discard tokens from a failed model
+            attempt_config = {
+                **config,
+                "metadata": {**config.get("metadata", {}), "llm_attempt": attempt, "llm_model": name}
+            }
+            outcome = None
+            try:
+                response = await self._call(name, prompt, attempt_config, hedge)
+                outcome = "success"
+            except ModelBusyError as e:
+                # Local back-pressure says nothing about the upstream model's health
+                last_error = e
+                continue
+            except Exception as e:
+                if is_caller_error(e):
+                    raise
+                outcome = "failure"
+                last_error = e
+                continue
+            finally:
+                if outcome == "success":
+                    breaker.record_success()
+                elif outcome == "failure":
+                    breaker.record_failure()
+                else:
+                    # Busy, caller error or cancelled: free a half-open trial so the model is tried again
+                    breaker.release_trial()
+
+            response.response_metadata["served_by"] = name
+            return response
+
+        if isinstance(last_error, ModelBusyError):
+            raise last_error
+        raise ModelUnavailableError(f"No model could answer: {last_error}") from last_error
+
+    async def _call(self, name: str, prompt, config: RunnableConfig, hedge: bool) -> AIMessage:
+        started = time.perf_counter()
+        hedge_after = self.latency[name].p95() if hedge else None
+        primary = asyncio.create_task(self.invoke(name, prompt, config))
+        try:
+            if hedge_after is None:
+                response = await primary
+            else:
+                done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+                if done or not self.has_capacity(name):
+                    response = await primary
+                else:
+                    response = await self._race(name, primary, asyncio.create_task(self.invoke(name, prompt, config)))
+        finally:
+            # Do not leave the upstream call running if our caller was cancelled
+            if not primary.done():
+                primary.cancel()
+
+        self.latency[name].add(time.perf_counter() - started)
+        return response
+
+    async def _race(self, name: str, primary: asyncio.Task, hedged: asyncio.Task) -> AIMessage:
+        """Return the first successful result of two identical calls and cancel the other."""
+        pending = {primary, hedged}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGES.labels(name, "hedge" if task is hedged else "primary").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
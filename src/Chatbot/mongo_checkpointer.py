@@ -0,0 +1,187 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional
+
+from bson import Binary
+from cachetools import TTLCache
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from pymongo import ReplaceOne
+
+from logger import logger
+from src.Chatbot.thread_store import BoundedMemorySaver
+
+
+class MongoCheckpointSaver(BoundedMemorySaver):
+    """BoundedMemorySaver that persists the latest checkpoint of each thread to MongoDB.
+
+    Checkpoints are served from memory. Threads written since the last flush are
+    marked dirty and their newest checkpoint is upserted in one bulk write every
+    ``flush_interval`` seconds, so the several checkpoints a single turn produces
+    cost one Mongo write. A thread not held in memory is loaded from Mongo the
+    first time the graph asks for it, and a thread another worker has advanced
+    since we loaded it is reloaded. That version check runs at most once per
+    ``refresh_interval`` seconds per thread, so the several reads of one turn
+    cost one Mongo round trip.
+    """
+
+    def __init__(self, collection, flush_interval: float = 1.0, refresh_interval: float = 2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.collection = collection
+        self.flush_interval = flush_interval
+        # Threads compared with Mongo within the last refresh_interval seconds
+        self._checked = TTLCache(maxsize=self.max_threads, ttl=refresh_interval)
+        self._dirty: set = set()
+        # Serialised documents of dirty threads that were evicted before a flush
+        self._pending: Dict[str, dict] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # Held across each Mongo write so a delete cannot land between a flush's snapshot and its write
+        self._write_lock = asyncio.Lock()
+
+    def _latest_tuple(self, thread_id: str) -> Optional[CheckpointTuple]:
+        # Bypass BoundedMemorySaver.get_tuple so flushing does not refresh LRU order
+        return super(BoundedMemorySaver, self).get_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}})
+
+    def _latest_checkpoint_id(self, thread_id: str) -> Optional[str]:
+        checkpoints = self.storage.get(thread_id, {}).get("", {})
+        return max(checkpoints) if checkpoints else None
+
+    def _to_document(self, thread_id: str) -> Optional[dict]:
+        saved = self._latest_tuple(thread_id)
+        if saved is None:
+            return None
+        checkpoint_type, checkpoint_bytes = self.serde.dumps_typed(saved.checkpoint)
+        metadata_type, metadata_bytes = self.serde.dumps_typed(saved.metadata)
+        return {
+            "_id": thread_id,
+            "checkpoint_id": saved.checkpoint["id"],
+            "checkpoint_type": checkpoint_type,
+            "checkpoint": Binary(checkpoint_bytes),
+            "metadata_type": metadata_type,
+            "metadata": Binary(metadata_bytes),
+            "updated_at": datetime.utcnow(),
+        }
+
+    def _load_document(self, document: dict):
+        checkpoint = self.serde.loads_typed((document["checkpoint_type"], bytes(document["checkpoint"])))
+        metadata = self.serde.loads_typed((document["metadata_type"], bytes(document["metadata"])))
+        with self._lock:
+            self._drop(document["_id"])
+            # Call the in-memory put directly so a load is not written back as dirty
+            BoundedMemorySaver.put(
+                self,
+                {"configurable": {"thread_id": document["_id"], "checkpoint_ns": ""}},
+                checkpoint,
+                metadata,
+                checkpoint["channel_versions"],
+            )
+
+    def _drop(self, thread_id: str):
+        if thread_id in self._dirty:
+            self._dirty.discard(thread_id)
+            document = self._to_document(thread_id)
+            if document is not None:
+                self._pending[thread_id] = document
+        super()._drop(thread_id)
+
+    def delete_thread(self, thread_id: str):
+        with self._lock:
+            self._checked.pop(thread_id, None)
+            self._dirty.discard(thread_id)
+            super().delete_thread(thread_id)
+            self._pending.pop(thread_id, None)
+
+    async def adelete_thread(self, thread_id: str):
+        """Free a thread's state in memory and in MongoDB."""
+        self.delete_thread(thread_id)
+        # A flush already in flight may hold this thread's document; wait for it so it cannot re-create the thread
+        async with self._write_lock:
+            with self._lock:
+                # A failed flush queues its documents for retry
+                self._pending.pop(thread_id, None)
+            await self.collection.delete_one({"_id": thread_id})
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            self._dirty.add(config["configurable"]["thread_id"])
+            return saved
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id in self._pending and thread_id not in self:
+            # Evicted before its last state was flushed; the queued document is newest
+            self._load_document(self._pending[thread_id])
+        elif thread_id not in self._dirty and thread_id not in self._checked:
+            try:
+                await self._refresh(thread_id)
+                self._checked[thread_id] = True
+            except Exception as e:
+                logger.error(f"Failed to load checkpoint for thread {thread_id}: {e}")
+        return self.get_tuple(config)
+
+    async def _refresh(self, thread_id: str):
+        """Load a thread from Mongo if it is unknown here or another worker has moved it on."""
+        local_id = self._latest_checkpoint_id(thread_id) if thread_id in self else None
+        if local_id is not None:
+            stored = await self.collection.find_one({"_id": thread_id}, {"checkpoint_id": 1})
+            if not stored or stored["checkpoint_id"] <= local_id:
+                return
+        document = await self.collection.find_one({"_id": thread_id})
+        if document and thread_id not in self._dirty:
+            self._load_document(document)
+
+    async def flush(self):
+        """Write the newest checkpoint of every dirty thread in one bulk operation."""
+        async with self._write_lock:
+            await self._flush()
+
+    async def _flush(self):
+        with self._lock:
+            documents = self._pending
+            self._pending = {}
+            for thread_id in self._dirty:
+                document = self._to_document(thread_id)
+                if document is not None:
+                    documents[thread_id] = document
+            self._dirty = set()
+
+        if not documents:
+            return
+        try:
+            await self.collection.bulk_write(
+                [ReplaceOne({"_id": thread_id}, document, upsert=True) for thread_id, document in documents.items()],
+                ordered=False,
+            )
+        except Exception as e:
+            logger.error(f"Failed to flush {len(documents)} chat checkpoints: {e}")
+            with self._lock:
+                # Retry on the next flush unless a newer state has been queued since
+                for thread_id, document in documents.items():
+                    if thread_id not in self._dirty:
+                        self._pending.setdefault(thread_id, document)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
@@ -0,0 +1,38 @@
+import hashlib
+import re
+from typing import Optional
+
+from cachetools import TTLCache
+
+from src.metrics import CHAT_RESPONSE_CACHE_REQUESTS
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    return _WHITESPACE.sub(" ", question.casefold()).strip().rstrip("?!.")
+
+
+class ResponseCache:
+    """LRU + TTL cache of model answers for prompts that carry no conversation state."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def make_key(model: str, question: str, history: str = "") -> str:
+        history_hash = hashlib.sha256(history.encode()).hexdigest()
+        return hashlib.sha256(f"{model}\0{normalize_question(question)}\0{history_hash}".encode()).hexdigest()
+
+    def get(self, model: str, question: str, history: str = "") -> Optional[str]:
+        response = self._entries.get(self.make_key(model, question, history))
+        if response is None:
+            CHAT_RESPONSE_CACHE_REQUESTS.labels(model=model, result="miss").inc()
+        else:
+            CHAT_RESPONSE_CACHE_REQUESTS.labels(model=model, result="hit").inc()
+        return response
+
+    def set(self, model: str, question: str, response: str, history: str = ""):
+        if response:
+            self._entries[self.make_key(model, question, history)] = response
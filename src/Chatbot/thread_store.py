@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+
+
+class BoundedMemorySaver(MemorySaver):
+    """MemorySaver shared by every thread, bounded by thread count and idle time.
+
+    Threads are kept in least-recently-used order. A thread is dropped once more
+    than ``max_threads`` are held or it has been idle for ``idle_ttl`` seconds.
+    Only the newest ``keep_checkpoints`` checkpoints of a thread are retained,
+    since the chat graph never reads older ones.
+    """
+
+    def __init__(self, max_threads: int = 1000, idle_ttl: float = 3600, keep_checkpoints: int = 3):
+        super().__init__()
+        self.max_threads = max_threads
+        self.idle_ttl = idle_ttl
+        self.keep_checkpoints = keep_checkpoints
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        # (thread_id, checkpoint_ns, checkpoint_id) -> channel versions, used to find blobs to free
+        self._versions: Dict[Tuple[str, str, str], ChannelVersions] = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, thread_id: str) -> bool:
+        return thread_id in self._last_seen
+
+    def _touch(self, thread_id: str):
+        self._last_seen[thread_id] = time.monotonic()
+        self._last_seen.move_to_end(thread_id)
+        self._evict()
+
+    def _evict(self):
+        deadline = time.monotonic() - self.idle_ttl
+        while self._last_seen:
+            thread_id, last_seen = next(iter(self._last_seen.items()))
+            if len(self._last_seen) <= self.max_threads and last_seen >= deadline:
+                break
+            self._drop(thread_id)
+
+    def _drop_checkpoint(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, keep_blobs: set = frozenset()):
+        self.storage[thread_id][checkpoint_ns].pop(checkpoint_id, None)
+        self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        versions = self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), {})
+        for channel, version in versions.items():
+            if (channel, version) not in keep_blobs:
+                self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
+
+    def _drop(self, thread_id: str):
+        self._last_seen.pop(thread_id, None)
+        for checkpoint_ns, checkpoints in list(self.storage.get(thread_id, {}).items()):
+            for checkpoint_id in list(checkpoints):
+                self._drop_checkpoint(thread_id, checkpoint_ns, checkpoint_id)
+        self.storage.pop(thread_id, None)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_checkpoints:
+            return
+        ordered = sorted(checkpoints)
+        stale, kept = ordered[:-self.keep_checkpoints], ordered[-self.keep_checkpoints:]
+        # Blobs are shared between checkpoints whose channel did not change
+        keep_blobs = {
+            item
+            for checkpoint_id in kept
+            for item in self._versions.get((thread_id, checkpoint_ns, checkpoint_id), {}).items()
+        }
+        for checkpoint_id in stale:
+            self._drop_checkpoint(thread_id, checkpoint_ns, checkpoint_id, keep_blobs)
+
+    def delete_thread(self, thread_id: str):
+        """Free all state held for a thread."""
+        with self._lock:
+            self._drop(thread_id)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if thread_id not in self._last_seen:
+                # Avoid materialising empty entries for threads we have never stored
+                return None
+            self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            self._touch(thread_id)
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            self._versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+            self._prune(thread_id, checkpoint_ns)
+            return saved
+
+    def put_writes(self, config: RunnableConfig, writes, task_id: str, task_path: str = "") -> None:
+        with self._lock:
+            if config["configurable"]["thread_id"] not in self._last_seen:
+                return
+            super().put_writes(config, writes, task_id, task_path)
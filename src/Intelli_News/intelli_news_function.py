@@ -1,6 +1,9 @@
-import requests
+import httpx
 from dotenv import load_dotenv
 import os
+from typing import Optional
+from logger import logger
+from src.singleflight import SingleFlight
 load_dotenv(override=True)
 
 BING_API_KEY = os.getenv("BING_API_KEY")
@@ -9,31 +12,89 @@ BING_API_KEY = os.getenv("BING_API_KEY")
 BING_NEWS_SEARCH_URL = "https://api.bing.microsoft.com/v7.0/news/search"
 BING_NEWS_LATEST_URL = "https://api.bing.microsoft.com/v7.0/news"
 
+# Outbound connection settings for the shared news client
+NEWS_CONNECT_TIMEOUT = float(os.getenv("NEWS_CONNECT_TIMEOUT", "3"))
+NEWS_READ_TIMEOUT = float(os.getenv("NEWS_READ_TIMEOUT", "8"))
+NEWS_MAX_CONNECTIONS = int(os.getenv("NEWS_MAX_CONNECTIONS", "50"))
+NEWS_MAX_KEEPALIVE = int(os.getenv("NEWS_MAX_KEEPALIVE", "20"))
 
-def search_bing_news(query):
-    headers = {'Ocp-Apim-Subscription-Key': BING_API_KEY}
+# Articles fetched (and cached) per query; the news routes page within this many
+NEWS_FETCH_COUNT = int(os.getenv("NEWS_FETCH_COUNT", "50"))
+
+# Fields of the compact article returned by search_bing_news
+NEWS_FIELDS = ("title", "url", "description", "published_at", "provider", "category", "image_url")
+
+_client: Optional[httpx.AsyncClient] = None
+
+# Concurrent requests for the same query share one Bing call
+bing_news_flight = SingleFlight("bing_news")
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        headers={'Ocp-Apim-Subscription-Key': BING_API_KEY or ""},
+        timeout=httpx.Timeout(NEWS_READ_TIMEOUT, connect=NEWS_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=NEWS_MAX_CONNECTIONS, max_keepalive_connections=NEWS_MAX_KEEPALIVE),
+    )
+
+
+def get_news_client() -> httpx.AsyncClient:
+    """Shared keep-alive client for Bing; created on first use if the app did not start it."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def start_news_client():
+    get_news_client()
+
+
+async def close_news_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def compact_article(result: dict) -> dict:
+    """Reduce a raw Bing article to the fields our clients render."""
+    image = result.get('image', {})
+    # Prefer the original image and fall back to the thumbnail
+    image_url = image.get('contentUrl') or image.get('thumbnail', {}).get('contentUrl')
+    providers = result.get('provider') or [{}]
+    return {
+        'title': result.get('name'),
+        'url': result.get('url'),
+        'description': result.get('description'),
+        'published_at': result.get('datePublished'),
+        'provider': providers[0].get('name'),
+        'category': result.get('category'),
+        'image_url': image_url,
+    }
+
+
+async def search_bing_news(query):
+    """Search Bing News and return compact articles (see ``NEWS_FIELDS``).
+
+    Bad responses from Bing are logged and give an empty list; connection
+    failures and timeouts raise ``httpx.TransportError``.
+    """
+    return await bing_news_flight.do(query, lambda: _fetch_bing_news(query))
+
+
+async def _fetch_bing_news(query):
     params = {
         'q': query,
         'textDecorations': True,
         'textFormat': "HTML",
         'originalImg': True,  # Request original images
-        'count': 20
+        'count': NEWS_FETCH_COUNT
     }
     try:
-        response = requests.get(BING_NEWS_SEARCH_URL, headers=headers, params=params)
+        response = await get_news_client().get(BING_NEWS_SEARCH_URL, params=params)
         response.raise_for_status()
-        results = response.json().get('value', [])
-        
-        # Extract high-quality image URLs if available
-        for result in results:
-            if 'image' in result and 'contentUrl' in result['image']:
-                result['image_url'] = result['image']['contentUrl']  # Original image
-            elif 'image' in result and 'thumbnail' in result['image']:
-                result['image_url'] = result['image']['thumbnail']['contentUrl']  # Fallback to thumbnail
-            else:
-                result['image_url'] = None  # No image available
-
-        return results
-    except (requests.RequestException, ValueError) as e:
-        print(f"Error fetching Bing News: {e}")
+        return [compact_article(result) for result in response.json().get('value', [])]
+    except (httpx.HTTPStatusError, ValueError) as e:
+        logger.error(f"Error fetching Bing News: {e}")
         return []
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from logger import logger
+from src.Intelli_News.intelli_news_function import search_bing_news
+from src.metrics import NEWS_CACHE_REFRESHES, NEWS_CACHE_REQUESTS
+
+load_dotenv(override=True)
+
+DEFAULT_NEWS_QUERY = "latest news"
+
+NEWS_CACHE_SIZE = int(os.getenv("NEWS_CACHE_SIZE", "500"))
+NEWS_CACHE_FRESH_TTL = float(os.getenv("NEWS_CACHE_FRESH_TTL", "300"))
+NEWS_CACHE_STALE_TTL = float(os.getenv("NEWS_CACHE_STALE_TTL", "3600"))
+NEWS_PREFETCH_INTERVAL = float(os.getenv("NEWS_PREFETCH_INTERVAL", "240"))
+NEWS_PREFETCH_CATEGORIES = [
+    category.strip()
+    for category in os.getenv(
+        "NEWS_PREFETCH_CATEGORIES", "world,business,technology,science,health,sports,entertainment,politics"
+    ).split(",")
+    if category.strip()
+]
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class NewsCache:
+    """Stale-while-revalidate cache of news results keyed by normalized query.
+
+    Entries younger than ``fresh_ttl`` are served as is. Older entries are served
+    until ``stale_ttl`` while one background refresh replaces them. Only entries
+    past ``stale_ttl`` or never fetched make the caller wait for Bing. Empty
+    results are never cached, so a failed fetch cannot replace good news.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[List[dict]]],
+        maxsize: int,
+        fresh_ttl: float,
+        stale_ttl: float,
+        prefetch_queries: List[str] = (),
+        prefetch_interval: float = 240,
+    ):
+        self.fetch = fetch
+        self.maxsize = maxsize
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.prefetch_queries = [normalize_query(query) for query in prefetch_queries]
+        self.prefetch_interval = prefetch_interval
+        self._entries: "OrderedDict[str, Tuple[float, List[dict]]]" = OrderedDict()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._prefetch_task: Optional[asyncio.Task] = None
+
+    def _store(self, key: str, results: List[dict]):
+        if not results:
+            return
+        self._entries[key] = (time.monotonic(), results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get(self, query: str) -> List[dict]:
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry is not None:
+            fetched_at, results = entry
+            age = time.monotonic() - fetched_at
+            if age < self.fresh_ttl:
+                self._entries.move_to_end(key)
+                NEWS_CACHE_REQUESTS.labels("hit").inc()
+                return results
+            if age < self.stale_ttl:
+                self._entries.move_to_end(key)
+                NEWS_CACHE_REQUESTS.labels("stale").inc()
+                self.refresh_in_background(key, "stale")
+                return results
+
+        NEWS_CACHE_REQUESTS.labels("miss").inc()
+        results = await self.fetch(key)
+        self._store(key, results)
+        return results
+
+    async def refresh(self, key: str, trigger: str):
+        try:
+            results = await self.fetch(key)
+        except Exception as e:
+            NEWS_CACHE_REFRESHES.labels(trigger, "error").inc()
+            logger.error(f"Failed to refresh news for '{key}': {e}")
+            return
+        NEWS_CACHE_REFRESHES.labels(trigger, "ok" if results else "empty").inc()
+        self._store(key, results)
+
+    def refresh_in_background(self, key: str, trigger: str):
+        """Start a refresh of ``key`` unless one is already running."""
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self.refresh(key, trigger))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def prefetch(self):
+        """Refresh every prefetched query whose entry would go stale before the next pass."""
+        deadline = time.monotonic() - self.fresh_ttl + self.prefetch_interval
+        keys = [
+            key for key in self.prefetch_queries
+            if key not in self._entries or self._entries[key][0] <= deadline
+        ]
+        await asyncio.gather(*(self.refresh(key, "prefetch") for key in keys if key not in self._refreshing))
+
+    async def _prefetch_loop(self):
+        while True:
+            await self.prefetch()
+            await asyncio.sleep(self.prefetch_interval)
+
+    def start(self):
+        if self._prefetch_task is None and self.prefetch_queries:
+            self._prefetch_task = asyncio.create_task(self._prefetch_loop())
+
+    async def stop(self):
+        tasks = list(self._refreshing.values())
+        if self._prefetch_task is not None:
+            tasks.append(self._prefetch_task)
+            self._prefetch_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+news_cache = NewsCache(
+    search_bing_news,
+    maxsize=NEWS_CACHE_SIZE,
+    fresh_ttl=NEWS_CACHE_FRESH_TTL,
+    stale_ttl=NEWS_CACHE_STALE_TTL,
+    prefetch_queries=[DEFAULT_NEWS_QUERY] + NEWS_PREFETCH_CATEGORIES,
+    prefetch_interval=NEWS_PREFETCH_INTERVAL,
+)
@@ -0,0 +1,96 @@
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import docx
+import fitz
+from dotenv import load_dotenv
+from fastapi import UploadFile
+
+from src.metrics import RESUME_EXTRACT_DURATION, RESUME_EXTRACT_REJECTED
+
+load_dotenv()
+
+RESUME_MAX_BYTES = int(os.getenv("RESUME_MAX_BYTES", str(5 * 1024 * 1024)))
+RESUME_MAX_PAGES = int(os.getenv("RESUME_MAX_PAGES", "10"))
+RESUME_EXTRACT_WORKERS = int(os.getenv("RESUME_EXTRACT_WORKERS", "4"))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Parsing is CPU-bound; a small dedicated pool keeps it off the event loop without starving other work
+extract_pool = ThreadPoolExecutor(max_workers=RESUME_EXTRACT_WORKERS, thread_name_prefix="resume-extract")
+# PyMuPDF is not thread-safe, so PDFs are parsed one at a time on their own thread
+pdf_extract_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="resume-extract-pdf")
+
+
+class ResumeExtractionError(ValueError):
+    """A resume that cannot be accepted; ``status_code`` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def resume_format(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in (".pdf", ".docx", ".txt"):
+        RESUME_EXTRACT_REJECTED.labels("unknown", "format").inc()
+        raise ResumeExtractionError("Unsupported file format", status_code=415)
+    return extension[1:]
+
+
+async def read_upload(file: UploadFile, fmt: str, max_bytes: int = RESUME_MAX_BYTES) -> bytes:
+    """Read an upload in chunks, stopping as soon as it exceeds ``max_bytes``."""
+    if file.size is not None and file.size > max_bytes:
+        RESUME_EXTRACT_REJECTED.labels(fmt, "size").inc()
+        raise ResumeExtractionError(f"Resume is larger than {max_bytes // 1024} KB", status_code=413)
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            RESUME_EXTRACT_REJECTED.labels(fmt, "size").inc()
+            raise ResumeExtractionError(f"Resume is larger than {max_bytes // 1024} KB", status_code=413)
+    return bytes(buffer)
+
+
+def extract_text_from_pdf(file_bytes: bytes) -> str:
+    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+        if doc.page_count > RESUME_MAX_PAGES:
+            RESUME_EXTRACT_REJECTED.labels("pdf", "pages").inc()
+            raise ResumeExtractionError(f"Resume has more than {RESUME_MAX_PAGES} pages", status_code=413)
+        return "\n".join(page.get_text() for page in doc)
+
+
+def extract_text_from_docx(file_bytes: bytes) -> str:
+    doc = docx.Document(io.BytesIO(file_bytes))
+    return "\n".join(p.text for p in doc.paragraphs)
+
+
+EXTRACTORS = {
+    "pdf": extract_text_from_pdf,
+    "docx": extract_text_from_docx,
+    "txt": lambda file_bytes: file_bytes.decode("utf-8", errors="ignore"),
+}
+
+
+def _timed_extract(fmt: str, file_bytes: bytes) -> str:
+    started = time.perf_counter()
+    try:
+        return EXTRACTORS[fmt](file_bytes)
+    finally:
+        RESUME_EXTRACT_DURATION.labels(fmt).observe(time.perf_counter() - started)
+
+
+async def extract_resume_text(file: UploadFile) -> str:
+    """Read and parse an uploaded resume in the extraction pool."""
+    fmt = resume_format(file.filename)
+    content = await read_upload(file, fmt)
+    try:
+        pool = pdf_extract_pool if fmt == "pdf" else extract_pool
+        return await asyncio.get_running_loop().run_in_executor(pool, _timed_extract, fmt, content)
+    except ResumeExtractionError:
+        raise
+    except Exception as e:
+        RESUME_EXTRACT_REJECTED.labels(fmt, "unreadable").inc()
+        raise ResumeExtractionError(f"Could not read {fmt} resume: {e}", status_code=422)
@@ -0,0 +1,44 @@
+import re
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or our that the their this to was
+were will with you your we they he she i me my not but if then than so such can may must should
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def tfidf_similarity(job_description: str, documents: Sequence[str]) -> np.ndarray:
+    """Cosine similarity of each document to the job description over TF-IDF vectors.
+
+    The vocabulary is the job description's terms; words a resume has but the
+    job does not ask for cannot raise its score.
+    """
+    vocabulary: Dict[str, int] = {}
+    for token in tokenize(job_description):
+        vocabulary.setdefault(token, len(vocabulary))
+    if not vocabulary or not documents:
+        return np.zeros(len(documents))
+
+    # Row 0 is the job description, the rest are the documents
+    counts = np.zeros((len(documents) + 1, len(vocabulary)))
+    for row, text in enumerate([job_description, *documents]):
+        for token in tokenize(text):
+            column = vocabulary.get(token)
+            if column is not None:
+                counts[row, column] += 1
+
+    # Sublinear term frequency so repeating a keyword has diminishing returns
+    term_frequency = np.log1p(counts)
+    document_frequency = (counts[1:] > 0).sum(axis=0)
+    idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+    vectors = term_frequency * idf
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors[1:] @ vectors[0]
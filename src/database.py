@@ -1,7 +1,13 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import ServerSelectionTimeoutError
+from logger import logger
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import asyncio
 import os
+import sys
 
 load_dotenv()
 # MongoDB Connection
@@ -14,6 +20,8 @@ login_activity_collection = db["login_activity"]
 notes_collection = db["notes"]
 todo_collection = db["todo"]
 chats_collection = db["chats"]
+chat_checkpoints_collection = db["chat_checkpoints"]
+chat_threads_collection = db["chat_threads"]
 
 # Helper function: Get user from DB (by username or email)
 async def get_user(username: str = None, email: str = None):
@@ -24,8 +32,150 @@ async def get_user(username: str = None, email: str = None):
         query["email"] = email
     return await users_collection.find_one(query)
 
+# Fields the login handlers read; _id is returned by default
+LOGIN_FIELDS = {"username": 1, "email": 1, "password": 1, "name": 1, "gender": 1, "dob": 1}
+
+
+async def find_login_user(username_or_email: str, projection: dict = LOGIN_FIELDS):
+    """Resolve a login identifier with one query; a username match wins over an email match."""
+    users = await users_collection.find(
+        {"$or": [{"username": username_or_email}, {"email": username_or_email}]}, projection
+    ).limit(2).to_list(length=2)
+    for user in users:
+        if user.get("username") == username_or_email:
+            return user
+    return users[0] if users else None
+
+
+async def user_exists(username: str, email: str) -> bool:
+    return await users_collection.find_one({"$or": [{"username": username}, {"email": email}]}, {"_id": 1}) is not None
+
 async def save_login_activity(login_data : dict):
     await login_activity_collection.insert_one(login_data)
 
 def get_todo_collection():
-    return todo_collection
\ No newline at end of file
+    return todo_collection
+
+# Chat checkpoints are rebuilt from chats_collection when missing, so idle ones can expire
+CHAT_CHECKPOINT_TTL = int(os.getenv("CHAT_CHECKPOINT_TTL", str(30 * 24 * 3600)))
+
+# Seconds between index creation attempts while MongoDB is unreachable
+INDEX_RETRY_INTERVAL = float(os.getenv("INDEX_RETRY_INTERVAL", "30"))
+
+# Every index the application relies on, applied idempotently at startup by ensure_indexes
+INDEXES = [
+    (users_collection, [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ]),
+    (otp_collection, [
+        # Latest OTP for an email
+        IndexModel([("email", ASCENDING), ("expires_at", DESCENDING)]),
+        # Mongo deletes an OTP once its expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ]),
+    (notes_collection, [
+        IndexModel([("user_id", ASCENDING), ("note_id", ASCENDING)]),
+        IndexModel([("note_id", ASCENDING)]),
+        # Only shared notes carry a token. Their expires_at ends the link, not the note, so no TTL here
+        IndexModel([("share_token", ASCENDING)], sparse=True),
+    ]),
+    (todo_collection, [
+        IndexModel([("user_id", ASCENDING)]),
+    ]),
+    (chats_collection, [
+        # History pages and thread rehydration filter on user/thread and sort by time
+        IndexModel([("user_id", ASCENDING), ("thread_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    ]),
+    (chat_threads_collection, [
+        # One summary per thread (also required by $merge when rebuilding), listed by recency
+        IndexModel([("user_id", ASCENDING), ("thread_id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("last_activity", DESCENDING), ("_id", DESCENDING)]),
+    ]),
+    (chat_checkpoints_collection, [
+        IndexModel([("updated_at", ASCENDING)], expireAfterSeconds=CHAT_CHECKPOINT_TTL),
+    ]),
+]
+
+# Representative filter/sort of each hot query, explained by `python -m src.database` to catch collection scans
+QUERY_SHAPES = [
+    (users_collection, {"username": ""}, None),
+    (users_collection, {"email": ""}, None),
+    (users_collection, {"$or": [{"username": ""}, {"email": ""}]}, None),
+    (otp_collection, {"email": ""}, [("expires_at", -1)]),
+    (notes_collection, {"user_id": ObjectId()}, None),
+    (notes_collection, {"note_id": "", "user_id": ObjectId()}, None),
+    (notes_collection, {"note_id": "", "share_token": ""}, None),
+    (todo_collection, {"user_id": ObjectId()}, None),
+    (chats_collection, {"user_id": ObjectId(), "thread_id": ""}, [("timestamp", -1), ("_id", -1)]),
+    (chat_threads_collection, {"user_id": ObjectId()}, [("last_activity", -1), ("_id", -1)]),
+]
+
+
+async def ensure_indexes() -> bool:
+    """Create every index in INDEXES; one that fails (e.g. duplicates under a unique key) is logged and skipped.
+
+    Gives up on the first server selection timeout, since every other index would wait out the same timeout,
+    and returns False so the caller can try again later.
+    """
+    for collection, indexes in INDEXES:
+        for index in indexes:
+            try:
+                # A no-op when an identical index already exists
+                await collection.create_indexes([index])
+            except ServerSelectionTimeoutError as e:
+                logger.error(
+                    f"MongoDB is unreachable, indexes not created: {e}. Until they are, /chats backfills and "
+                    f"thread summary rebuilds fail (their $merge needs the unique chat_threads index)"
+                )
+                return False
+            except Exception as e:
+                logger.error(f"Failed to create index {index.document['key']} on {collection.name}: {e}")
+    return True
+
+
+async def retry_ensure_indexes(interval: float = INDEX_RETRY_INTERVAL):
+    """Keep calling ensure_indexes until MongoDB is reachable; run in the background after a failed startup attempt."""
+    while True:
+        await asyncio.sleep(interval)
+        if await ensure_indexes():
+            logger.info("MongoDB indexes created")
+            return
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+    # Sharded clusters report a winning plan per shard
+    for shard in plan.get("shards", []):
+        yield from _plan_stages(shard.get("winningPlan", {}))
+
+
+async def find_collection_scans() -> list:
+    """Explain each query in QUERY_SHAPES and return the ones whose winning plan is a COLLSCAN."""
+    scans = []
+    for collection, query, sort in QUERY_SHAPES:
+        command = {"find": collection.name, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        try:
+            explained = await db.command("explain", command, verbosity="queryPlanner")
+        except ServerSelectionTimeoutError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to explain query on {collection.name}: {e}")
+            continue
+        if "COLLSCAN" in _plan_stages(explained["queryPlanner"]["winningPlan"]):
+            shape = {"collection": collection.name, "filter": list(query), "sort": [key for key, _ in sort or []]}
+            logger.warning(f"Query does a collection scan: {shape}")
+            scans.append(shape)
+    return scans
+
+
+if __name__ == "__main__":
+    # Offline check, kept off the startup path: exits non-zero when a hot query scans its collection
+    sys.exit(1 if asyncio.run(find_collection_scans()) else 0)
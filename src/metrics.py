@@ -0,0 +1,191 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Application metrics; registered on the default registry so the instrumentator's /metrics exposes them
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+AUTH_REQUEST_DURATION = Histogram(
+    "auth_request_duration_seconds",
+    "Latency of login and signup requests by outcome (success, rejected, error)",
+    ["endpoint", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+USER_CACHE_REQUESTS = Counter(
+    "auth_user_cache_requests_total",
+    "Lookups of the authenticated user in the in-process user cache",
+    ["result"],
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "CPU time of bcrypt hash and verify calls in the password pool",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1, 2, 5),
+)
+PASSWORD_HASH_QUEUE_DEPTH = Gauge("password_hash_queue_depth", "Password hash/verify calls waiting for a pool worker")
+PASSWORD_HASH_REJECTED = Counter("password_hash_rejected_total", "Password operations rejected because the pool queue was full")
+PASSWORD_REHASHES = Counter("password_rehashes_total", "Password hashes upgraded at login after the bcrypt cost changed")
+CHAT_RESPONSE_CACHE_REQUESTS = Counter(
+    "chat_response_cache_requests_total",
+    "Lookups in the chat response cache",
+    ["model", "result"],
+)
+NEWS_CACHE_REQUESTS = Counter(
+    "news_cache_requests_total",
+    "Lookups in the news cache by outcome (hit, stale, miss)",
+    ["result"],
+)
+WEB_SEARCH_CACHE_REQUESTS = Counter(
+    "web_search_cache_requests_total",
+    "Lookups in the Tavily search result cache",
+    ["result"],
+)
+SUMMARY_CACHE_REQUESTS = Counter(
+    "summary_cache_requests_total",
+    "Lookups in the article summary cache",
+    ["result"],
+)
+SINGLE_FLIGHT_REQUESTS = Counter(
+    "single_flight_requests_total",
+    "Outbound calls by whether they started an upstream request (leader) or joined one in flight (coalesced)",
+    ["name", "result"],
+)
+NEWS_CACHE_REFRESHES = Counter(
+    "news_cache_refreshes_total",
+    "Background news cache refreshes by trigger and outcome",
+    ["trigger", "outcome"],
+)
+
+RESUME_SECTION_CACHE_REQUESTS = Counter(
+    "resume_section_cache_requests_total",
+    "Lookups in the per-section resume analysis cache",
+    ["section", "result"],
+)
+RESUME_EXTRACT_DURATION = Histogram(
+    "resume_extract_duration_seconds",
+    "Time to extract text from an uploaded resume",
+    ["format"],
+    buckets=LATENCY_BUCKETS,
+)
+RESUME_EXTRACT_REJECTED = Counter(
+    "resume_extract_rejected_total",
+    "Resume uploads rejected before or during extraction",
+    ["format", "reason"],
+)
+
+LIVEBOT_REQUESTS = Counter(
+    "livebot_requests_total",
+    "Live chat messages by the local intent that answered them, or llm",
+    ["intent"],
+)
+
+LLM_CALL_DURATION = Histogram(
+    "llm_call_duration_seconds",
+    "Wall time of successful LLM calls",
+    ["provider", "model"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from request to the first streamed token",
+    ["provider", "model"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens",
+    "Prompt tokens per LLM call as reported by the provider",
+    ["provider", "model"],
+    buckets=TOKEN_BUCKETS,
+)
+LLM_COMPLETION_TOKENS = Histogram(
+    "llm_completion_tokens",
+    "Completion tokens per LLM call as reported by the provider",
+    ["provider", "model"],
+    buckets=TOKEN_BUCKETS,
+)
+LLM_RETRIES = Counter("llm_retries_total", "LLM calls retried after a transient failure", ["provider", "model"])
+LLM_TIMEOUTS = Counter("llm_timeouts_total", "LLM calls that timed out", ["provider", "model"])
+LLM_ERRORS = Counter("llm_errors_total", "LLM calls that failed", ["provider", "model"])
+LLM_CANCELLED = Counter(
+    "llm_cancelled_total",
+    "LLM calls abandoned before finishing (client disconnect, losing hedge, or never reported back)",
+    ["provider", "model"],
+)
+LLM_HEDGES = Counter("llm_hedged_requests_total", "Hedged chat model calls by which copy answered first", ["model", "winner"])
+LLM_FALLBACKS = Counter("llm_fallbacks_total", "Chat requests answered by a model other than the one requested", ["requested_model", "served_model"])
+LLM_IN_FLIGHT = Gauge("llm_in_flight_requests", "Chat model calls holding a concurrency slot", ["model"])
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "Chat model calls waiting for a concurrency slot", ["model"])
+LLM_CIRCUIT_OPEN = Gauge("llm_circuit_open", "1 while a chat model's circuit breaker is open", ["model"])
+
+
+def is_timeout(error: BaseException) -> bool:
+    """True for timeout errors from asyncio or any provider SDK, including wrapped ones."""
+    while error is not None:
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(error).__name__ \
+                or "DeadlineExceeded" in type(error).__name__:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class LLMCall:
+    """Records the metrics of one LLM call."""
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.started = time.perf_counter()
+        self._first_token_seen = False
+
+    def first_token(self):
+        if not self._first_token_seen:
+            self._first_token_seen = True
+            LLM_TIME_TO_FIRST_TOKEN.labels(self.provider, self.model).observe(time.perf_counter() - self.started)
+
+    def usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        if prompt_tokens:
+            LLM_PROMPT_TOKENS.labels(self.provider, self.model).observe(prompt_tokens)
+        if completion_tokens:
+            LLM_COMPLETION_TOKENS.labels(self.provider, self.model).observe(completion_tokens)
+
+    def finish(self, error: BaseException = None):
+        if error is None:
+            LLM_CALL_DURATION.labels(self.provider, self.model).observe(time.perf_counter() - self.started)
+            return
+        if isinstance(error, asyncio.CancelledError):
+            LLM_CANCELLED.labels(self.provider, self.model).inc()
+            return
+        LLM_ERRORS.labels(self.provider, self.model).inc()
+        if is_timeout(error):
+            LLM_TIMEOUTS.labels(self.provider, self.model).inc()
+
+
+@contextmanager
+def llm_call(provider: str, model: str):
+    """Time an LLM call; the yielded LLMCall takes token usage and first-token events."""
+    call = LLMCall(provider, model)
+    try:
+        yield call
+    except (Exception, asyncio.CancelledError) as e:
+        call.finish(e)
+        raise
+    call.finish()
+
+
+@contextmanager
+def auth_request(endpoint: str):
+    """Time a login/signup request; client errors count as rejected, anything else as error."""
+    started = time.perf_counter()
+    outcome = "success"
+    try:
+        yield
+    except Exception as e:
+        outcome = "rejected" if getattr(e, "status_code", 500) < 500 else "error"
+        raise
+    finally:
+        AUTH_REQUEST_DURATION.labels(endpoint, outcome).observe(time.perf_counter() - started)
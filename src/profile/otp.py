@@ -1,6 +1,7 @@
 from src.database import otp_collection, users_collection
 from datetime import datetime, timedelta
 from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
 from src.profile.password import get_password_hash
 from src.profile.form import UserSignup
 from logger import logger
@@ -15,7 +16,7 @@ async def store_otp_in_db(user: UserSignup, otp: str):
         "username": user.username,
         "gender": user.gender,
         "dob": user.dob,
-        "password": get_password_hash(user.password),
+        "password": await get_password_hash(user.password),
     }
     await otp_collection.insert_one(otp_data)
 
@@ -57,5 +58,10 @@ async def register_user(otp_entry):
         "dob": otp_entry["dob"],
         "password": otp_entry["password"]
     }
-    await users_collection.insert_one(user_data)
+    try:
+        await users_collection.insert_one(user_data)
+    except DuplicateKeyError:
+        # Another pending signup with the same username or email was verified first
+        await otp_collection.delete_one({"email": otp_entry["email"]})
+        raise HTTPException(status_code=400, detail="Username or email already exists")
     await otp_collection.delete_one({"email": otp_entry["email"]})
\ No newline at end of file
@@ -1,13 +1,73 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
+from src.metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED
+
+load_dotenv()
+
+# bcrypt cost factor; hashes made with any other cost are upgraded at the user's next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
 # Password Hashing Context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt releases the GIL, so a few threads hash in parallel without blocking the event loop
+password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+# Calls submitted to the pool and not yet finished; only touched from the event loop
+_in_pool = 0
+
+
+def _timed(operation: str, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        PASSWORD_HASH_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+
+async def _run_in_pool(operation: str, fn, *args):
+    """Run a bcrypt call in the password pool, shedding load once its queue is full."""
+    global _in_pool
+    if _in_pool >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        PASSWORD_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in requests, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _in_pool += 1
+    PASSWORD_HASH_QUEUE_DEPTH.set(max(0, _in_pool - PASSWORD_HASH_WORKERS))
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_pool, _timed, operation, fn, *args)
+    finally:
+        _in_pool -= 1
+        PASSWORD_HASH_QUEUE_DEPTH.set(max(0, _in_pool - PASSWORD_HASH_WORKERS))
 
 # Helper function: Hash password
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
+async def get_password_hash(password: str):
+    return await _run_in_pool("hash", pwd_context.hash, password)
 
 
 # Helper function: Verify password
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+async def verify_password(plain_password, hashed_password):
+    return await _run_in_pool("verify", pwd_context.verify, plain_password, hashed_password)
+
+
+# Helper function: Verify password and rehash it if it was made with an outdated cost
+async def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    return await _run_in_pool("verify", pwd_context.verify_and_update, plain_password, hashed_password)
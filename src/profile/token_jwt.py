@@ -2,7 +2,7 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import datetime, timedelta,timezone
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends,Security
-from src.database import get_user
+from src.profile.user_cache import get_cached_user
 
 ALGORITHM = "HS256"
 REFRESH_SECRET_KEY = "your_refresh_secret_key"
@@ -35,7 +35,7 @@ async def get_current_user(token: str = Security(oauth2_scheme)):
         if not username or not exp or datetime.fromtimestamp(exp, tz=timezone.utc) < datetime.now(timezone.utc):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
 
-        user = await get_user(username=username)
+        user = await get_cached_user(username)
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
 
@@ -0,0 +1,41 @@
+import os
+from typing import Optional
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+from src.database import get_user
+from src.metrics import USER_CACHE_REQUESTS
+
+load_dotenv()
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Profile writes on other workers are only seen here once this expires, so keep it short
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+# username -> user document, for resolving the principal of authenticated requests
+user_cache: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+async def get_cached_user(username: str) -> Optional[dict]:
+    user = user_cache.get(username)
+    if user is not None:
+        USER_CACHE_REQUESTS.labels("hit").inc()
+    else:
+        USER_CACHE_REQUESTS.labels("miss").inc()
+        user = await get_user(username=username)
+        if user is None:
+            return None
+        user_cache[username] = user
+    # Handlers get their own copy so they cannot change the cached document
+    return dict(user)
+
+
+def invalidate_user(username: str = None, email: str = None):
+    """Drop a user from the cache after their document changes."""
+    if username:
+        user_cache.pop(username, None)
+    if email:
+        for cached_username, user in list(user_cache.items()):
+            if user.get("email") == email:
+                user_cache.pop(cached_username, None)
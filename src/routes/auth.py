@@ -2,9 +2,11 @@ from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi import APIRouter, FastAPI
 from src.profile.otp import store_otp_in_db, get_latest_otp, validate_otp, register_user
-from src.profile.password import verify_password
+from src.profile.password import verify_and_update_password
+from src.profile.user_cache import invalidate_user
+from src.metrics import PASSWORD_REHASHES, auth_request
 from src.profile.email_service import send
-from src.database import get_user,save_login_activity
+from src.database import find_login_user,user_exists,save_login_activity,users_collection
 from src.profile.form import UserSignup, OTPVerification, LoginRequest,LoginActivityRequest
 from logger import logger
 import pyotp
@@ -13,25 +15,35 @@ from src.profile.token_jwt import create_access_token, create_refresh_token,get_
 auth_router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+async def check_password(user: dict, password: str) -> bool:
+    """Verify a login password, upgrading the stored hash if the bcrypt cost has changed."""
+    valid, new_hash = await verify_and_update_password(password, user["password"])
+    if valid and new_hash:
+        await users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+        invalidate_user(username=user["username"])
+        PASSWORD_REHASHES.inc()
+    return valid
+
+
 @auth_router.post("/signup")
 async def signup(user: UserSignup):
     logger.info(f"Signup request received for {user.email}")
-    # Check if user already exists
-    existing_user = await get_user(username=user.username) or await get_user(email=user.email)
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username or email already exists")
+    with auth_request("signup"):
+        # Check if user already exists
+        if await user_exists(user.username, user.email):
+            raise HTTPException(status_code=400, detail="Username or email already exists")
 
-    # Generate a static OTP
-    otp_secret = pyotp.random_base32()
-    totp = pyotp.TOTP(otp_secret)
-    otp = totp.now()  # Fixed OTP at signup time
+        # Generate a static OTP
+        otp_secret = pyotp.random_base32()
+        totp = pyotp.TOTP(otp_secret)
+        otp = totp.now()  # Fixed OTP at signup time
 
-    # Store OTP with expiration time (10 minutes)
-    await store_otp_in_db(user, otp)
+        # Store OTP with expiration time (10 minutes)
+        await store_otp_in_db(user, otp)
 
-    # Send OTP via email
-    send(user.email, otp)
-    logger.info(f"OTP {otp} sent to {user.email}")
+        # Send OTP via email
+        send(user.email, otp)
+        logger.info(f"OTP {otp} sent to {user.email}")
 
     return {"message": "OTP sent to your email. Please verify to complete registration within 10 minutes."}
 
@@ -50,13 +62,14 @@ async def verify_otp(data: OTPVerification):
 # Login Route (Accepting Username OR Email)
 @auth_router.post("/login")
 async def login(request: LoginRequest):
-    # Fetch user from database using username or email
-    user = await get_user(username=request.username_or_email) or await get_user(email=request.username_or_email)
+    with auth_request("login"):
+        # Fetch user from database using username or email
+        user = await find_login_user(request.username_or_email)
 
-    if not user or not verify_password(request.password, user["password"]):
-        raise HTTPException(status_code=400, detail="Invalid credentials")
+        if not user or not await check_password(user, request.password):
+            raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    access_token = create_access_token(data={"sub": user["username"]})
+        access_token = create_access_token(data={"sub": user["username"]})
 
     return {
         "access_token": access_token,
@@ -72,12 +85,13 @@ async def login(request: LoginRequest):
 #for swagger ui 
 @auth_router.post("/login-form")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):  # FastAPI expects OAuth2PasswordRequestForm
-    user = await get_user(username=form_data.username) or await get_user(email=form_data.username)
+    with auth_request("login_form"):
+        user = await find_login_user(form_data.username, {"username": 1, "password": 1})
 
-    if not user or not verify_password(form_data.password, user["password"]):
-        raise HTTPException(status_code=400, detail="Invalid credentials")
+        if not user or not await check_password(user, form_data.password):
+            raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    access_token = create_access_token(data={"sub": user["username"]})
+        access_token = create_access_token(data={"sub": user["username"]})
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -1,21 +1,21 @@
-from src.Chatbot.chat_def import create_graph, AVAILABLE_MODELS, ModelListResponse, ChatRequest, graphs
-from langchain_core.messages import HumanMessage
-from src.database import chats_collection
+from src.Chatbot.chat_def import get_graph, rehydrate_thread, record_cached_turn, delete_thread_state, schedule_summary, state_key, response_cache, AVAILABLE_MODELS, ModelListResponse, ChatRequest, ModelBusyError, ModelUnavailableError
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+from src.database import chats_collection, chat_threads_collection, users_collection
+from src.profile.user_cache import invalidate_user
 from datetime import datetime
 import uuid
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from src.profile.token_jwt import get_current_user
-from collections import OrderedDict
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional, Tuple
+from src.sse import format_sse
+import asyncio
 
 chat_router = APIRouter(tags=["Chatbot"])
 
-# Manage active graphs with a size limit
-graphs = OrderedDict()
-
 # Define a Pydantic model for chat history items to handle ObjectId serialization
 class ChatHistoryItem(BaseModel):
     thread_id: str
@@ -23,23 +23,179 @@ class ChatHistoryItem(BaseModel):
     response: str
     model: str
     timestamp: datetime
+    cursor: str
 
     class Config:
         json_encoders = {ObjectId: str}
 
-def create_graph_with_limit(model_name: str, thread_id: str):
-    if len(graphs) > 100:  # Limit active graphs
-        graphs.popitem(last=False)  # Remove oldest entry
-    graphs[thread_id] = create_graph(model_name, thread_id)
+class ChatThreadSummary(BaseModel):
+    thread_id: str
+    title: str
+    last_message: str
+    turn_count: int
+    last_activity: datetime
+    model: str
+
+HISTORY_FIELDS = {"thread_id": 1, "message": 1, "response": 1, "model": 1, "timestamp": 1}
+THREAD_FIELDS = {"thread_id": 1, "title": 1, "last_message": 1, "turn_count": 1, "last_activity": 1, "model": 1}
+TITLE_LENGTH = 60
+PREVIEW_LENGTH = 120
+
+def utc_now() -> datetime:
+    """The current UTC time at the millisecond precision BSON stores, so cursors match stored values."""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def encode_cursor(timestamp: datetime, object_id: ObjectId) -> str:
+    return f"{timestamp.isoformat(timespec='milliseconds')}_{object_id}"
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Optional[ObjectId]]:
+    """Parse a `<timestamp>_<id>` cursor; a bare timestamp from older clients has no tie-breaker."""
+    timestamp, _, object_id = cursor.partition("_")
+    try:
+        return datetime.fromisoformat(timestamp), ObjectId(object_id) if object_id else None
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+def cursor_filter(field: str, before: Optional[str] = None, after: Optional[str] = None) -> dict:
+    """Match documents strictly between two cursors, ordered by (`field`, _id) so equal times page correctly."""
+    query, ties = {}, []
+    for cursor, strict, inclusive, past_tie in ((before, "$lt", "$lte", "$gte"), (after, "$gt", "$gte", "$lte")):
+        if not cursor:
+            continue
+        value, object_id = decode_cursor(cursor)
+        query.setdefault(field, {})[inclusive if object_id else strict] = value
+        if object_id:
+            ties.append({field: value, "_id": {past_tie: object_id}})
+    if ties:
+        query["$nor"] = ties
+    return query
+
+def to_history_item(item: dict) -> ChatHistoryItem:
+    return ChatHistoryItem(
+        thread_id=item["thread_id"],
+        message=item["message"],
+        response=item["response"],
+        model=item["model"],
+        timestamp=item["timestamp"],
+        cursor=encode_cursor(item["timestamp"], item["_id"])
+    )
+
+async def save_chat_turn(user: dict, thread_id: str, message: str, response: str, model: str, requested_model: str = None):
+    """Persist one question/answer pair to chats_collection and return the stored document.
+
+    `model` is the model that answered, which differs from `requested_model` after a fallback.
+    """
+    turn = {
+        "user_id": ObjectId(user["_id"]),
+        "thread_id": thread_id,
+        "message": message,
+        "response": response,
+        "model": model,
+        "requested_model": requested_model or model,
+        "timestamp": utc_now()
+    }
+    # Keep the per-user thread index used by /chats in step with the turn log
+    _, summary = await asyncio.gather(
+        chats_collection.insert_one(turn),
+        chat_threads_collection.update_one(
+            {"user_id": turn["user_id"], "thread_id": thread_id},
+            {
+                "$setOnInsert": {"title": message[:TITLE_LENGTH], "created_at": turn["timestamp"]},
+                "$set": {"last_message": response[:PREVIEW_LENGTH], "last_activity": turn["timestamp"], "model": model},
+                "$inc": {"turn_count": 1}
+            },
+            upsert=True
+        )
+    )
+    # A continued thread whose turns predate the index gets its title and count from the full turn log
+    if summary.upserted_id is not None and await chats_collection.find_one(
+        {"user_id": turn["user_id"], "thread_id": thread_id, "_id": {"$ne": turn["_id"]}}, {"_id": 1}
+    ):
+        await rebuild_thread_index(turn["user_id"], thread_id)
+    return turn
+
+async def rebuild_thread_index(user_id: ObjectId, thread_id: str = None):
+    """Rebuild thread summaries from chats_collection, for all of a user's threads or just one.
+
+    The turn log is the source of truth, so existing summaries are replaced.
+    """
+    match = {"user_id": user_id}
+    if thread_id is not None:
+        match["thread_id"] = thread_id
+    await chats_collection.aggregate([
+        {"$match": match},
+        {"$sort": {"timestamp": 1}},
+        {"$group": {
+            "_id": "$thread_id",
+            "title": {"$first": {"$substrCP": ["$message", 0, TITLE_LENGTH]}},
+            "last_message": {"$last": {"$substrCP": ["$response", 0, PREVIEW_LENGTH]}},
+            "turn_count": {"$sum": 1},
+            "created_at": {"$first": "$timestamp"},
+            "last_activity": {"$last": "$timestamp"},
+            "model": {"$last": "$model"}
+        }},
+        {"$project": {"_id": 0, "user_id": user_id, "thread_id": "$_id", "title": 1, "last_message": 1,
+                      "turn_count": 1, "created_at": 1, "last_activity": 1, "model": 1}},
+        {"$merge": {"into": chat_threads_collection.name, "on": ["user_id", "thread_id"],
+                    "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]).to_list(length=None)
+
+async def ensure_thread_index(user: dict):
+    """Backfill a user's thread summaries once; the user document records that it was done."""
+    if user.get("chat_threads_indexed"):
+        return
+    await rebuild_thread_index(ObjectId(user["_id"]))
+    await users_collection.update_one({"_id": ObjectId(user["_id"])}, {"$set": {"chat_threads_indexed": True}})
+    invalidate_user(username=user.get("username"))
+
+def served_model(message, default: str) -> str:
+    return message.response_metadata.get("served_by", default)
+
+async def stream_model_tokens(graph, input_message: HumanMessage, state_id: str):
+    """Yield ("token", text) as the model node produces the answer.
+
+    A ("reset", None) event means the model failed mid-answer and another model is
+    starting over; the stream ends with ("model", name) for the model that answered.
+    """
+    streamed = False
+    attempt = 0
+    model_name = None
+    async for message, metadata in graph.astream(
+        {"messages": [input_message]},
+        # Hedged duplicate calls would interleave their tokens, so streaming never hedges
+        {"configurable": {"thread_id": state_id, "hedge": False}},
+        stream_mode="messages"
+    ):
+        if metadata.get("langgraph_node") != "model":
+            continue
+        if metadata.get("llm_attempt", attempt) != attempt:
+            attempt = metadata["llm_attempt"]
+            if streamed:
+                streamed = False
+                yield "reset", None
+        model_name = metadata.get("llm_model", model_name)
+        if isinstance(message, AIMessageChunk):
+            if message.content:
+                streamed = True
+                yield "token", message.content
+        elif isinstance(message, AIMessage):
+            model_name = served_model(message, model_name)
+            if not streamed:
+                # The model answered without streaming; send the whole message at once.
+                streamed = True
+                yield "token", message.content
+    yield "model", model_name
 
 @chat_router.get("/models", response_model=ModelListResponse)
 async def get_models():
-    return {"models": AVAILABLE_MODELS}
+    return {"models": list(AVAILABLE_MODELS)}
 
 @chat_router.post("/chat")
 async def chat(request: ChatRequest, user: dict = Depends(get_current_user)):
-    """Chat endpoint - streams response, stores conversation, returns chat history."""
+    """Chat endpoint - runs the model, stores the turn, returns it with a history cursor."""
     thread_id = request.thread_id or str(uuid.uuid4())
+    state_id = state_key(user["_id"], thread_id)
 
     if request.model not in AVAILABLE_MODELS:
         raise HTTPException(
@@ -47,96 +203,174 @@ async def chat(request: ChatRequest, user: dict = Depends(get_current_user)):
             detail=f"Model '{request.model}' is not available"
         )
 
-    if thread_id not in graphs:
-        graphs[thread_id] = create_graph(request.model, thread_id)
-
-    graph = graphs[thread_id]
+    graph = get_graph(request.model)
     input_message = HumanMessage(content=request.message)
 
     response_content = ""
+    model_name = request.model
     try:
-        async for event in graph.astream(
-            {"messages": [input_message]},
-            {"configurable": {"thread_id": thread_id}},
-            stream_mode="values"
-        ):
-            response_content = event["messages"][-1].content
+        has_history = bool(request.thread_id) and await rehydrate_thread(graph, thread_id, ObjectId(user["_id"]))
+        # Only the first turn of a thread is a stateless prompt that can be answered from cache
+        use_cache = response_cache is not None and not has_history
+        cached = response_cache.get(request.model, request.message) if use_cache else None
+        if cached is not None:
+            response_content = cached
+            await record_cached_turn(graph, state_id, request.message, cached, request.model)
+        else:
+            async for event in graph.astream(
+                {"messages": [input_message]},
+                {"configurable": {"thread_id": state_id}},
+                stream_mode="values"
+            ):
+                response_content = event["messages"][-1].content
+                model_name = served_model(event["messages"][-1], request.model)
+            if use_cache and model_name == request.model:
+                response_cache.set(request.model, request.message, response_content)
+    except (ModelBusyError, ModelUnavailableError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"AI processing failed: {str(e)}"
         )
 
+    schedule_summary(request.model, state_id)
     try:
-        await chats_collection.insert_one({
-            "user_id": ObjectId(user["_id"]),
-            "thread_id": thread_id,
-            "message": request.message,
-            "response": response_content,
-            "model": request.model,
-            "timestamp": datetime.utcnow()
-        })
-
-        # Fetch chat history and serialize ObjectId
-        chat_history_cursor = chats_collection.find(
-            {"user_id": ObjectId(user["_id"]), "thread_id": thread_id}
-        ).sort("timestamp", 1)
-        chat_history_raw = await chat_history_cursor.to_list(length=None)
-        chat_history = [
-            ChatHistoryItem(
-                thread_id=item["thread_id"],
-                message=item["message"],
-                response=item["response"],
-                model=item["model"],
-                timestamp=item["timestamp"]
-            )
-            for item in chat_history_raw
-        ]
-
+        turn = await save_chat_turn(user, thread_id, request.message, response_content, model_name, request.model)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
         )
 
+    # Only the new turn is returned; earlier turns come from /history using the cursor
     return {
         "thread_id": thread_id,
-        "model": request.model,
-        "chat_history": [item.dict() for item in chat_history] # Return as list of dictionaries
+        "model": model_name,
+        "requested_model": request.model,
+        "turn": to_history_item(turn).dict(),
+        "cursor": encode_cursor(turn["timestamp"], turn["_id"])
     }
 
 
+@chat_router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, user: dict = Depends(get_current_user)):
+    """Chat endpoint - sends tokens as Server-Sent Events, stores the finished turn."""
+    thread_id = request.thread_id or str(uuid.uuid4())
+    state_id = state_key(user["_id"], thread_id)
+
+    if request.model not in AVAILABLE_MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model '{request.model}' is not available"
+        )
+
+    graph = get_graph(request.model)
+    input_message = HumanMessage(content=request.message)
+
+    async def event_stream():
+        yield format_sse({"thread_id": thread_id, "model": request.model}, event="start")
+
+        tokens = []
+        model_name = request.model
+        try:
+            has_history = bool(request.thread_id) and await rehydrate_thread(graph, thread_id, ObjectId(user["_id"]))
+            use_cache = response_cache is not None and not has_history
+            cached = response_cache.get(request.model, request.message) if use_cache else None
+            if cached is not None:
+                tokens.append(cached)
+                yield format_sse({"token": cached})
+                await record_cached_turn(graph, state_id, request.message, cached, request.model)
+            else:
+                async for kind, value in stream_model_tokens(graph, input_message, state_id):
+                    if kind == "token":
+                        tokens.append(value)
+                        yield format_sse({"token": value})
+                    elif kind == "reset":
+                        tokens.clear()
+                        yield format_sse({}, event="reset")
+                    elif value:
+                        model_name = value
+                if use_cache and model_name == request.model:
+                    response_cache.set(request.model, request.message, "".join(tokens))
+        except (ModelBusyError, ModelUnavailableError) as e:
+            yield format_sse({"detail": str(e)}, event="error")
+            return
+        except Exception as e:
+            yield format_sse({"detail": f"AI processing failed: {str(e)}"}, event="error")
+            return
+
+        response_content = "".join(tokens)
+        schedule_summary(request.model, state_id)
+        try:
+            turn = await save_chat_turn(user, thread_id, request.message, response_content, model_name, request.model)
+        except Exception as e:
+            yield format_sse({"detail": f"Database error: {str(e)}"}, event="error")
+            return
+
+        yield format_sse({
+            "thread_id": thread_id,
+            "model": model_name,
+            "requested_model": request.model,
+            "response": response_content,
+            "cursor": encode_cursor(turn["timestamp"], turn["_id"])
+        }, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @chat_router.get("/chats")
-async def get_all_chats(user: dict = Depends(get_current_user)):
+async def get_all_chats(
+    before: Optional[str] = Query(None, description="Only threads last active before this cursor (a previous next_cursor)"),
+    limit: int = Query(20, ge=1, le=100),
+    user: dict = Depends(get_current_user)
+):
+    """List the user's threads, most recently active first."""
+    query = {"user_id": ObjectId(user["_id"]), **cursor_filter("last_activity", before=before)}
     try:
-        chat_sessions = await chats_collection.distinct("thread_id", {"user_id": ObjectId(user["_id"])})
-        return {"chats": chat_sessions}
+        await ensure_thread_index(user)
+        cursor = chat_threads_collection.find(query, THREAD_FIELDS).sort([("last_activity", -1), ("_id", -1)]).limit(limit)
+        threads = await cursor.to_list(length=limit)
+
+        return {
+            "chats": [ChatThreadSummary(**thread).dict() for thread in threads],
+            "next_cursor": encode_cursor(threads[-1]["last_activity"], threads[-1]["_id"]) if len(threads) == limit else None
+        }
     except Exception as e:
         return JSONResponse(content={"error": f"Failed to fetch chats: {str(e)}"}, status_code=500)
 
 @chat_router.get("/history/{thread_id}", response_model=List[ChatHistoryItem])
-async def get_chat_history(thread_id: str, user: dict = Depends(get_current_user)):
+async def get_chat_history(
+    thread_id: str,
+    before: Optional[str] = Query(None, description="Only turns older than this cursor"),
+    after: Optional[str] = Query(None, description="Only turns newer than this cursor"),
+    limit: int = Query(50, ge=1, le=200),
+    user: dict = Depends(get_current_user)
+):
+    """Page through a thread oldest-first; without cursors the newest `limit` turns are returned."""
     try:
-        cursor = chats_collection.find(
-            {"user_id": ObjectId(user["_id"]), "thread_id": thread_id}
-        ).sort("timestamp", 1)
-        chat_history_raw = await cursor.to_list(length=None)
+        query = {"user_id": ObjectId(user["_id"]), "thread_id": thread_id, **cursor_filter("timestamp", before, after)}
+
+        # Served by the (user_id, thread_id, timestamp, _id) index
+        if after and not before:
+            cursor = chats_collection.find(query, HISTORY_FIELDS).sort([("timestamp", 1), ("_id", 1)]).limit(limit)
+            chat_history_raw = await cursor.to_list(length=limit)
+        else:
+            cursor = chats_collection.find(query, HISTORY_FIELDS).sort([("timestamp", -1), ("_id", -1)]).limit(limit)
+            chat_history_raw = (await cursor.to_list(length=limit))[::-1]
 
-        if not chat_history_raw:
+        if not chat_history_raw and not (before or after):
             raise HTTPException(status_code=404, detail="No chat history found for this thread.")
 
-        chat_history = [
-            ChatHistoryItem(
-                thread_id=item["thread_id"],
-                message=item["message"],
-                response=item["response"],
-                model=item["model"],
-                timestamp=item["timestamp"]
-            )
-            for item in chat_history_raw
-        ]
-
-        return chat_history
+        return [to_history_item(item) for item in chat_history_raw]
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -151,6 +385,8 @@ async def delete_chat(thread_id: str, user: dict = Depends(get_current_user)):
         result = await chats_collection.delete_many({"thread_id": thread_id, "user_id": ObjectId(user["_id"])})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="No chat session found to delete.")
+        await chat_threads_collection.delete_one({"thread_id": thread_id, "user_id": ObjectId(user["_id"])})
+        await delete_thread_state(state_key(user["_id"], thread_id))
         return {"message": "Chat session deleted successfully."}
     except Exception as e:
         return JSONResponse(content={"error": f"Failed to delete chat: {str(e)}"}, status_code=500)
@@ -163,22 +399,39 @@ async def chat_test(request: ChatRequest):
     if request.model not in AVAILABLE_MODELS:
         raise HTTPException(status_code=400, detail=f"Model {request.model} not available")
 
-    if thread_id not in graphs:
-        create_graph_with_limit(request.model, thread_id)
-
-    graph = graphs[thread_id]
+    graph = get_graph(request.model)
     input_message = HumanMessage(content=request.message)
 
+    cached = response_cache.get(request.model, request.message) if response_cache is not None else None
+    if cached is not None:
+        return {
+            "response": cached,
+            "thread_id": thread_id,
+            "model": request.model,
+            "requested_model": request.model,
+            "chat_history": []
+        }
+
     try:
         response_content = ""
+        model_name = request.model
         async for event in graph.astream({"messages": [input_message]}, {"configurable": {"thread_id": thread_id}}, stream_mode="values"):
             response_content = event["messages"][-1].content
+            model_name = served_model(event["messages"][-1], request.model)
+        if response_cache is not None and model_name == request.model:
+            response_cache.set(request.model, request.message, response_content)
+    except (ModelBusyError, ModelUnavailableError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI response failed: {str(e)}")
+    finally:
+        # Test threads are never continued, so their state is not kept
+        await delete_thread_state(thread_id)
 
     return {
         "response": response_content,
         "thread_id": thread_id,
-        "model": request.model,
+        "model": model_name,
+        "requested_model": request.model,
         "chat_history": []
     }
\ No newline at end of file
@@ -1,11 +1,17 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import google.generativeai as genai
 import os
-import subprocess
+import re
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import quote_plus
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from fastapi import APIRouter
+from src.metrics import LIVEBOT_REQUESTS, llm_call
+from src.sse import format_sse
 
 live_bot = APIRouter(tags=["LiveBot"])
 # Load environment variables
@@ -14,10 +20,12 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # Configure Gemini API
 genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-1.5-flash")
+GEMINI_MODEL = "gemini-1.5-flash"
+model = genai.GenerativeModel(GEMINI_MODEL)
 # Define request model
 class ChatRequest(BaseModel):
     message: str
+    stream: bool = False  # Answer as Server-Sent Events, streaming Gemini's tokens
 
 # Famous websites mapping
 FAMOUS_WEBSITES = {
@@ -35,30 +43,116 @@ FAMOUS_WEBSITES = {
     "whatsapp": "https://web.whatsapp.com"
 }
 
-def open_url(url: str):
-    """Opens a URL in the default web browser."""
+SEARCH_URLS = {
+    "google": "https://www.google.com/search?q={}",
+    "youtube": "https://www.youtube.com/results?search_query={}",
+    "amazon": "https://www.amazon.com/s?k={}",
+    "wikipedia": "https://en.wikipedia.org/w/index.php?search={}",
+    "reddit": "https://www.reddit.com/search/?q={}",
+    "github": "https://github.com/search?q={}",
+}
+
+# Commands are matched locally so the client can act on them without a round trip to Gemini
+_SITES = "|".join(re.escape(site) for site in FAMOUS_WEBSITES)
+_POLITE = r"(?:(?:hey|ok|okay)\s+\w+\s+)?(?:(?:please|can you|could you)\s+)?"
+_REQUEST = r"(?:(?:hey|ok|okay)\s+\w+\s+)?(?:please|can you|could you)\s+"
+OPEN_SITE_PATTERN = re.compile(
+    rf"^{_POLITE}(?:(?:open|launch|start|visit|go to|take me to|show me)\s+(?:up\s+)?(?:the\s+)?)?"
+    rf"(?P<site>{_SITES})(?:\.com|\.org)?(?:\s+(?:please|for me|now))?[.!?]*$"
+)
+# Without "www." a host only counts as a domain for these TLDs, so "open notes.txt" or "open main.py"
+# goes to the LLM instead of becoming a URL
+_TLDS = "|".join("""
+com org net edu gov io dev app ai co me info biz tv xyz tech site online blog news
+uk us ca au in de fr es it nl se no jp cn kr br ru eu
+""".split())
+OPEN_DOMAIN_PATTERN = re.compile(
+    rf"^{_POLITE}(?:open|go to|visit)\s+(?P<domain>www\.[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{{2,}}"
+    rf"|[a-z0-9-]+(?:\.[a-z0-9-]+)*\.(?:{_TLDS}))[.!?]*$"
+)
+SEARCH_PATTERN = re.compile(
+    rf"^{_POLITE}(?:search|look up|find)\s+(?:for\s+)?(?P<query>.+?)\s+on\s+(?P<site>{'|'.join(SEARCH_URLS)})[.!?]*$"
+    # A bare "google ..." or "search ..." is as likely a statement ("google is a search engine company"),
+    # so without a site it takes "for", "look up", or an explicit request
+    rf"|^{_POLITE}(?:(?:search|google)(?:\s+(?:the web|online))?\s+for|look up)\s+(?P<web_query>.+?)[.!?]*$"
+    rf"|^{_REQUEST}(?:search|google)\s+(?P<requested_query>.+?)[.!?]*$"
+)
+TIME_PATTERN = re.compile(r"^(?:what(?:'s| is) the time|what time is it)(?: now)?\??$")
+DATE_PATTERN = re.compile(r"^(?:what(?:'s| is) (?:the date|today's date)|what day is (?:it|today))(?: today)?\??$")
+
+
+def match_intent(message: str) -> Optional[dict]:
+    """Answer deterministic commands locally; returns None when the message needs the LLM."""
+    text = " ".join(message.lower().split())
+
+    match = OPEN_SITE_PATTERN.match(text)
+    if match:
+        site = match["site"]
+        return {"intent": "open_site", "message": f"Opening {site}...",
+                "action": {"type": "open_url", "url": FAMOUS_WEBSITES[site]}}
+
+    match = OPEN_DOMAIN_PATTERN.match(text)
+    if match:
+        domain = match["domain"]
+        return {"intent": "open_site", "message": f"Opening {domain}...",
+                "action": {"type": "open_url", "url": f"https://{domain}"}}
+
+    match = SEARCH_PATTERN.match(text)
+    if match:
+        site = match["site"] or "google"
+        query = match["query"] or match["web_query"] or match["requested_query"]
+        return {"intent": "search", "message": f"Searching {site} for {query}...",
+                "action": {"type": "open_url", "url": SEARCH_URLS[site].format(quote_plus(query))}}
+
+    if TIME_PATTERN.match(text) or DATE_PATTERN.match(text):
+        # The server's clock is UTC; the client renders it in the user's own time zone
+        kind = "time" if TIME_PATTERN.match(text) else "date"
+        return {"intent": kind, "message": f"Showing the {kind}.",
+                "action": {"type": f"show_{kind}", "utc": datetime.now(timezone.utc).isoformat()}}
+
+    return None
+
+
+async def stream_gemini(message: str):
+    """Yield SSE frames for Gemini's answer as its chunks arrive."""
+    parts = []
     try:
-        subprocess.run(["xdg-open", url], check=True)  # For Linux
-    except FileNotFoundError:
-        try:
-            subprocess.run(["open", url], check=True)  # For macOS
-        except FileNotFoundError:
-            subprocess.run(["start", url], shell=True, check=True)  # For Windows
+        with llm_call("gemini", GEMINI_MODEL) as call:
+            response = await model.generate_content_async(message, stream=True)
+            async for chunk in response:
+                call.first_token()
+                parts.append(chunk.text)
+                yield format_sse({"token": chunk.text})
+            call.usage(response.usage_metadata.prompt_token_count, response.usage_metadata.candidates_token_count)
+    except Exception as e:
+        yield format_sse({"detail": f"Error: {str(e)}"}, event="error")
+        return
+    yield format_sse({"message": "".join(parts)}, event="done")
+
+
+async def stream_action(result: dict):
+    yield format_sse({"message": result["message"], "action": result["action"]}, event="action")
+    yield format_sse({"message": result["message"]}, event="done")
+
 
 @live_bot.post("/livechat")
 async def chat(request: ChatRequest):
     try:
-        user_message = request.message.lower().strip()
-
-        # Check if message contains any famous website name
-        for site in FAMOUS_WEBSITES:
-            if site in user_message:
-                open_url(FAMOUS_WEBSITES[site])
-                return {"message": f"Opening {site}..."}
+        result = match_intent(request.message)
+        if result is not None:
+            LIVEBOT_REQUESTS.labels(result["intent"]).inc()
+            if request.stream:
+                return StreamingResponse(stream_action(result), media_type="text/event-stream")
+            return {"message": result["message"], "action": result["action"]}
 
         # Otherwise, use Gemini AI to respond
-        response = model.generate_content(request.message)
+        LIVEBOT_REQUESTS.labels("llm").inc()
+        if request.stream:
+            return StreamingResponse(stream_gemini(request.message), media_type="text/event-stream")
+        with llm_call("gemini", GEMINI_MODEL) as call:
+            response = await model.generate_content_async(request.message)
+            call.usage(response.usage_metadata.prompt_token_count, response.usage_metadata.candidates_token_count)
         return {"message": response.text}
-    
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
@@ -1,29 +1,67 @@
 from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
-import requests
-from src.Intelli_News.intelli_news_function import search_bing_news
+from fastapi.responses import ORJSONResponse
+from typing import List, Optional
+import httpx
+from src.Intelli_News.intelli_news_function import NEWS_FETCH_COUNT, NEWS_FIELDS
+from src.Intelli_News.news_cache import DEFAULT_NEWS_QUERY, news_cache
+
+news_router = APIRouter(prefix="/Intelli_news", tags=["News"], default_response_class=ORJSONResponse)
+
+FIELDS_DESCRIPTION = f"Comma-separated subset of: {', '.join(NEWS_FIELDS)}"
+
+
+def parse_fields(fields: Optional[str]) -> tuple:
+    if not fields:
+        return NEWS_FIELDS
+    selected = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in NEWS_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Unknown news fields: {', '.join(unknown)}. {FIELDS_DESCRIPTION}")
+    return selected
+
+
+def news_page(results: List[dict], fields: tuple, offset: int, limit: int) -> ORJSONResponse:
+    page = results[offset:offset + limit]
+    if fields != NEWS_FIELDS:
+        page = [{field: item.get(field) for field in fields} for item in page]
+    next_offset = offset + limit if offset + limit < len(results) else None
+    # Returned directly so the cached items skip FastAPI's jsonable_encoder pass
+    return ORJSONResponse({"results": page, "total": len(results), "next_offset": next_offset})
 
-news_router = APIRouter(prefix="/Intelli_news", tags=["News"])
 
 @news_router.get("/")
-async def get_news(query: Optional[str] = Query(None)):
+async def get_news(
+    query: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    # Pages are cut from the NEWS_FETCH_COUNT articles cached per query
+    offset: int = Query(0, ge=0, lt=NEWS_FETCH_COUNT),
+    limit: int = Query(20, ge=1, le=NEWS_FETCH_COUNT),
+):
     """
     Fetch news based on query.
     If no query is provided, it fetches the latest news.
     """
+    selected = parse_fields(fields)
     try:
-        news_results = search_bing_news(query if query else "latest news")
-        return {"results": news_results}
-    except requests.RequestException:
+        news_results = await news_cache.get(query if query else DEFAULT_NEWS_QUERY)
+        return news_page(news_results, selected, offset, limit)
+    except httpx.TransportError:
         raise HTTPException(status_code=503, detail="Lost Internet Connection")
 
 @news_router.get("/category/{category}")
-async def get_news_by_category(category: str):
+async def get_news_by_category(
+    category: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    # Pages are cut from the NEWS_FETCH_COUNT articles cached per query
+    offset: int = Query(0, ge=0, lt=NEWS_FETCH_COUNT),
+    limit: int = Query(20, ge=1, le=NEWS_FETCH_COUNT),
+):
     """
     Fetch news based on category.
     """
+    selected = parse_fields(fields)
     try:
-        news_results = search_bing_news(category)
-        return {"results": news_results}
-    except requests.RequestException:
+        news_results = await news_cache.get(category)
+        return news_page(news_results, selected, offset, limit)
+    except httpx.TransportError:
         raise HTTPException(status_code=503, detail="Lost Internet Connection")
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
+from pymongo.errors import DuplicateKeyError
 from src.database import get_user, users_collection
 from src.profile.token_jwt import generate_reset_token, verify_reset_token
 from src.profile.password import get_password_hash, verify_password
 from src.profile.email_service import send_forget
 from src.profile.form import ForgotPasswordRequest, ResetPasswordForm, UpdateProfileRequest
 from src.profile.token_jwt import get_current_user
+from src.profile.user_cache import invalidate_user
 
 
 profile_router = APIRouter(tags=["profile"])
@@ -32,8 +34,9 @@ async def reset_password(token: str, form_data: ResetPasswordForm):
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
 
     # Hash new password and update
-    hashed_password = get_password_hash(form_data.new_password)
+    hashed_password = await get_password_hash(form_data.new_password)
     await users_collection.update_one({"email": email}, {"$set": {"password": hashed_password}})
+    invalidate_user(email=email)
 
     return {"message": "Password successfully reset. You can now log in."}
 
@@ -76,15 +79,19 @@ async def update_profile(update_data: UpdateProfileRequest, current_user: dict =
             raise HTTPException(status_code=400, detail="Current password is required to change password")
 
         # Verify current password
-        if not verify_password(update_fields["current_password"], current_user["password"]):
+        if not await verify_password(update_fields["current_password"], current_user["password"]):
             raise HTTPException(status_code=400, detail="Current password is incorrect")
 
         # Hash and update the new password
-        update_fields["password"] = get_password_hash(update_fields["new_password"])
+        update_fields["password"] = await get_password_hash(update_fields["new_password"])
         del update_fields["new_password"]
         del update_fields["current_password"]
 
-    # Update the user record
-    await users_collection.update_one({"email": current_user["email"]}, {"$set": update_fields})
+    # Update the user record; the unique index catches a username taken since the check above
+    try:
+        await users_collection.update_one({"email": current_user["email"]}, {"$set": update_fields})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username already taken")
+    invalidate_user(username=current_user["username"], email=current_user["email"])
 
     return {"message": "Profile updated successfully"}
\ No newline at end of file
@@ -2,13 +2,20 @@ from fastapi import FastAPI, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 from fastapi import APIRouter
-import fitz
-import tempfile
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 from fastapi import HTTPException
-import docx
+from fastapi.responses import StreamingResponse
+from typing import Dict, List
+import asyncio
+from cachetools import TTLCache
+import hashlib
+from src.metrics import RESUME_SECTION_CACHE_REQUESTS, llm_call
+from src.singleflight import SingleFlight
+from src.sse import format_sse
+from src.Resume.extract import ResumeExtractionError, extract_resume_text
+from src.Resume.ranking import tfidf_similarity
 
 
 
@@ -18,35 +25,46 @@ resume_router = APIRouter(tags=["profile"])
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
+GEMINI_MODEL = "gemini-2.0-flash"
+model = genai.GenerativeModel(GEMINI_MODEL)
 
-def prompt_gemini(prompt):
-    response = model.generate_content(prompt)
+RESUME_CACHE_SIZE = int(os.getenv("RESUME_CACHE_SIZE", "1000"))
+RESUME_CACHE_TTL = float(os.getenv("RESUME_CACHE_TTL", "86400"))
+RESUME_SECTIONS = ("score", "tailored_resume", "career_path", "interview_preparation")
+
+# One cache per section, keyed on a hash of that section's prompt. A prompt holds exactly
+# the inputs its section depends on, so changing only company_name reuses the score.
+section_caches = {section: TTLCache(maxsize=RESUME_CACHE_SIZE, ttl=RESUME_CACHE_TTL) for section in RESUME_SECTIONS}
+section_flight = SingleFlight("resume_section")
+
+RESUME_BULK_MAX_FILES = int(os.getenv("RESUME_BULK_MAX_FILES", "50"))
+RESUME_BULK_MAX_TOP_K = int(os.getenv("RESUME_BULK_MAX_TOP_K", "10"))
+
+async def prompt_gemini(prompt):
+    with llm_call("gemini", GEMINI_MODEL) as call:
+        response = await model.generate_content_async(prompt)
+        call.usage(response.usage_metadata.prompt_token_count, response.usage_metadata.candidates_token_count)
     return response.text
-def extract_text_from_pdf(file_bytes):
-    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-        return "\n".join(page.get_text() for page in doc)
-
-def extract_text_from_docx(file_bytes):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-        tmp.write(file_bytes)
-        tmp.close()
-        doc = docx.Document(tmp.name)
-        return "\n".join([p.text for p in doc.paragraphs])
-
-def extract_resume_text(file: UploadFile):
-    content = file.file.read()
-    if file.filename.endswith(".pdf"):
-        return extract_text_from_pdf(content)
-    elif file.filename.endswith(".docx"):
-        return extract_text_from_docx(content)
-    elif file.filename.endswith(".txt"):
-        return content.decode("utf-8", errors="ignore")
-    else:
-        raise ValueError("Unsupported file format")
 
-async def process_resume(resume_file: UploadFile, job_description: str, company_name: str = None):
-    resume_text = extract_resume_text(resume_file)
+
+async def generate_section(section: str, prompt: str) -> str:
+    cache = section_caches[section]
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    cached = cache.get(key)
+    if cached is not None:
+        RESUME_SECTION_CACHE_REQUESTS.labels(section, "hit").inc()
+        return cached
+    RESUME_SECTION_CACHE_REQUESTS.labels(section, "miss").inc()
+
+    async def generate():
+        response = await prompt_gemini(prompt)
+        cache[key] = response
+        return response
+
+    return await section_flight.do((section, key), generate)
+
+def build_section_prompts(resume_text: str, job_description: str, company_name: str = None) -> Dict[str, str]:
+    """Prompt for each section of the analysis; none depends on another's answer."""
 
     # 1. Score Resume
     score_prompt = f"""
@@ -58,7 +76,6 @@ async def process_resume(resume_file: UploadFile, job_description: str, company_
     Job Description:
     {job_description}
     """
-    score = prompt_gemini(score_prompt)
 
     # 2. Tailor Resume
     if company_name:
@@ -84,7 +101,6 @@ async def process_resume(resume_file: UploadFile, job_description: str, company_
         {job_description}
         """
         
-    tailored_resume = prompt_gemini(tailor_prompt)
 
     # 3. Career Path Suggestion (based on the company if available)
     if company_name:
@@ -104,7 +120,6 @@ async def process_resume(resume_file: UploadFile, job_description: str, company_
         {job_description}
         """
         
-    career_path = prompt_gemini(career_path_prompt)
 
     # 4. Interview Preparation (based on company and role)
     if company_name:
@@ -124,21 +139,109 @@ async def process_resume(resume_file: UploadFile, job_description: str, company_
         {job_description}
         """
         
-    interview_preparation = prompt_gemini(interview_prep_prompt)
 
     return {
-        "score": score,
-        "tailored_resume": tailored_resume,
-        "career_path": career_path,
-        "interview_preparation": interview_preparation
+        "score": score_prompt,
+        "tailored_resume": tailor_prompt,
+        "career_path": career_path_prompt,
+        "interview_preparation": interview_prep_prompt
     }
 
 
+async def process_resume(resume_file: UploadFile, job_description: str, company_name: str = None):
+    resume_text = await extract_resume_text(resume_file)
+    prompts = build_section_prompts(resume_text, job_description, company_name)
+    # The sections are independent, so they are generated concurrently
+    results = await asyncio.gather(*(generate_section(section, prompt) for section, prompt in prompts.items()))
+    return dict(zip(prompts, results))
+
+
+async def stream_resume_sections(prompts: Dict[str, str]):
+    """Yield SSE frames, one per section in the order the sections finish."""
+    async def run_section(section, prompt):
+        try:
+            return section, await generate_section(section, prompt), None
+        except Exception as e:
+            return section, None, e
+
+    tasks = [asyncio.create_task(run_section(section, prompt)) for section, prompt in prompts.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            section, content, error = await next_done
+            if error is not None:
+                yield format_sse({"section": section, "detail": f"Resume analysis failed: {str(error)}"}, event="error")
+            else:
+                yield format_sse({"section": section, "content": content}, event="section")
+        yield format_sse({"sections": list(prompts)}, event="done")
+    finally:
+        # Stop generating sections nobody will receive once the client disconnects
+        for task in tasks:
+            task.cancel()
+
+
 @resume_router.post("/analyze/")
 async def analyze_resume(
     resume: UploadFile,
     job_description: str = Form(...),
-    company_name: Optional[str] = Form(None)  # Optional company name field
+    company_name: Optional[str] = Form(None),  # Optional company name field
+    stream: bool = Form(False)  # Send each section as an SSE event as soon as it is ready
 ):
-    result = await process_resume(resume, job_description, company_name)
-    return result
\ No newline at end of file
+    try:
+        if stream:
+            resume_text = await extract_resume_text(resume)
+            prompts = build_section_prompts(resume_text, job_description, company_name)
+            return StreamingResponse(stream_resume_sections(prompts), media_type="text/event-stream")
+        result = await process_resume(resume, job_description, company_name)
+        return result
+    except ResumeExtractionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@resume_router.post("/analyze/bulk/")
+async def rank_resumes(
+    resumes: List[UploadFile],
+    job_description: str = Form(...),
+    top_k: int = Form(5)
+):
+    """Rank many resumes against one job description.
+
+    Every resume gets a local TF-IDF similarity; only the ``top_k`` most similar
+    are sent to the Gemini scoring prompt used by /analyze/.
+    """
+    if len(resumes) > RESUME_BULK_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {RESUME_BULK_MAX_FILES} resumes per request")
+    if not 1 <= top_k <= RESUME_BULK_MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k must be between 1 and {RESUME_BULK_MAX_TOP_K}")
+
+    texts = await asyncio.gather(*(extract_resume_text(resume) for resume in resumes), return_exceptions=True)
+    ranked = []
+    rejected = []
+    for resume, text in zip(resumes, texts):
+        if isinstance(text, ResumeExtractionError):
+            rejected.append({"filename": resume.filename, "error": str(text)})
+        elif isinstance(text, Exception):
+            raise text
+        else:
+            ranked.append({"filename": resume.filename, "text": text})
+
+    similarities = tfidf_similarity(job_description, [item["text"] for item in ranked])
+    for item, similarity in zip(ranked, similarities):
+        item["similarity"] = round(float(similarity), 4)
+    ranked.sort(key=lambda item: item["similarity"], reverse=True)
+
+    shortlist = ranked[:top_k]
+    scores = await asyncio.gather(
+        *(generate_section("score", build_section_prompts(item["text"], job_description)["score"]) for item in shortlist),
+        return_exceptions=True,
+    )
+    results = []
+    for rank, item in enumerate(ranked, start=1):
+        result = {"rank": rank, "filename": item["filename"], "similarity": item["similarity"], "shortlisted": rank <= top_k}
+        if rank <= top_k:
+            score = scores[rank - 1]
+            if isinstance(score, Exception):
+                result["error"] = f"Scoring failed: {str(score)}"
+            else:
+                result["score"] = score
+        results.append(result)
+    return {"results": results, "rejected": rejected}
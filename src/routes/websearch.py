@@ -8,8 +8,16 @@ import os
 from agno.tools.newspaper4k import Newspaper4kTools
 from fastapi import APIRouter, Query,HTTPException, Request
 from fastapi import Query
-from typing import Dict, Any
-from tavily import TavilyClient
+from typing import Dict, Any, List, Literal, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
+import newspaper
+from tavily import AsyncTavilyClient
+from cachetools import TTLCache
+from src.metrics import SUMMARY_CACHE_REQUESTS, WEB_SEARCH_CACHE_REQUESTS, llm_call
+from logger import logger
+from src.singleflight import SingleFlight
+import asyncio
 # Load environment variables
 load_dotenv()
 
@@ -23,7 +31,7 @@ web_search_router = APIRouter(tags=["Web Search"])
 Groq.api_key = os.getenv("GROQ_API_KEY")
 
 # Initialize the Web Search Agent using Groq's LLaMA 3 model
-client = TavilyClient("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")
+client = AsyncTavilyClient(os.getenv("TAVILY_API_KEY", "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"))
 
 TAVILY_CONFIG = {
     "search_depth": "basic",
@@ -32,31 +40,215 @@ TAVILY_CONFIG = {
     "include_answer":"basic"
 }
 
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "10"))
+
+# Results keyed on (normalized query, search options)
+search_cache: TTLCache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
+# Identical searches and summaries already in flight are shared rather than repeated
+search_flight = SingleFlight("tavily_search")
+summary_flight = SingleFlight("article_summary")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+async def cached_search(query: str, options: Dict[str, Any]) -> dict:
+    """Tavily search through the result cache; concurrent misses for one key share a call."""
+    key = (normalize_query(query), tuple(sorted(options.items())))
+    cached = search_cache.get(key)
+    if cached is not None:
+        WEB_SEARCH_CACHE_REQUESTS.labels("hit").inc()
+        return cached
+    WEB_SEARCH_CACHE_REQUESTS.labels("miss").inc()
+
+    async def search():
+        response = await client.search(query=query, **options)
+        search_cache[key] = response
+        return response
+
+    return await search_flight.do(key, search)
+
+
+def search_options(search_depth: str, topic: str, max_results: int) -> Dict[str, Any]:
+    return {**TAVILY_CONFIG, "search_depth": search_depth, "topic": topic, "max_results": max_results}
+
+
 @web_search_router.get("/search")
-async def search_tavily(query: str = Query(..., description="Search query")):
-    response = client.search(
-    query=query,
-    **TAVILY_CONFIG
-)
-    return response
+async def search_tavily(
+    query: str = Query(..., description="Search query"),
+    search_depth: Literal["basic", "advanced"] = Query("basic"),
+    topic: Literal["general", "news", "finance"] = Query("general"),
+    max_results: int = Query(5, ge=1, le=20),
+):
+    return await cached_search(query, search_options(search_depth, topic, max_results))
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    search_depth: Literal["basic", "advanced"] = "basic"
+    topic: Literal["general", "news", "finance"] = "general"
+    max_results: int = 5
+
+
+@web_search_router.post("/search/batch")
+async def search_tavily_batch(request: BatchSearchRequest):
+    """Run several searches concurrently; a failed query reports its error without failing the batch."""
+    queries = list(dict.fromkeys(query.strip() for query in request.queries if query.strip()))
+    if not queries:
+        raise HTTPException(status_code=400, detail="At least one query is required")
+    if len(queries) > SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {SEARCH_BATCH_MAX_QUERIES} queries per batch")
+    if not 1 <= request.max_results <= 20:
+        raise HTTPException(status_code=400, detail="max_results must be between 1 and 20")
+
+    options = search_options(request.search_depth, request.topic, request.max_results)
+    responses = await asyncio.gather(*(cached_search(query, options) for query in queries), return_exceptions=True)
+    results = []
+    for query, response in zip(queries, responses):
+        if isinstance(response, Exception):
+            results.append({"query": query, "error": str(response) or type(response).__name__})
+        else:
+            results.append({"query": query, "response": response})
+    return {"results": results}
 
 
 class SummaryRequest(BaseModel):
     url: str
 
-# Initialize agent globally
-agent = Agent(
-    model=Groq(id="llama-3.3-70b-versatile"),
-    tools=[Newspaper4kTools()],
-    debug_mode=False,
-    show_tool_calls=False,
-)
+
+class BatchSummaryRequest(BaseModel):
+    urls: List[str]
+
+SUMMARY_MODEL = "llama-3.3-70b-versatile"
+
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+SUMMARY_BATCH_MAX_URLS = int(os.getenv("SUMMARY_BATCH_MAX_URLS", "20"))
+SUMMARY_FETCH_TIMEOUT = int(os.getenv("SUMMARY_FETCH_TIMEOUT", "10"))
+SUMMARY_MAX_ARTICLE_CHARS = int(os.getenv("SUMMARY_MAX_ARTICLE_CHARS", "12000"))
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "2000"))
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "86400"))
+# How long a fetched article's content hash is trusted before the page is downloaded again
+ARTICLE_HASH_TTL = float(os.getenv("ARTICLE_HASH_TTL", "900"))
+
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ocid"}
+
+# (canonical URL, article content hash) -> summary
+summary_cache: TTLCache = TTLCache(maxsize=SUMMARY_CACHE_SIZE, ttl=SUMMARY_CACHE_TTL)
+# canonical URL -> content hash of the article last downloaded from it
+article_hashes: TTLCache = TTLCache(maxsize=SUMMARY_CACHE_SIZE, ttl=ARTICLE_HASH_TTL)
+# Bounds concurrent article downloads and LLM calls across all summary requests
+summary_workers = asyncio.Semaphore(SUMMARY_WORKERS)
+
+
+def canonical_url(url: str) -> str:
+    """Normalise a URL so links to the same article share a cache entry."""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+def fetch_article(url: str) -> Optional[Tuple[str, str]]:
+    """Download and parse an article; returns (title, text) or None if no text could be extracted."""
+    try:
+        article = newspaper.article(url, request_timeout=SUMMARY_FETCH_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Could not read article {url}: {e}")
+        return None
+    if not article.text:
+        return None
+    return article.title or "", article.text
+
+
+def new_summary_agent(tools: bool = False) -> Agent:
+    # An Agent keeps per-run state on itself, so each summary gets its own
+    return Agent(
+        model=Groq(id=SUMMARY_MODEL),
+        tools=[Newspaper4kTools()] if tools else [],
+        debug_mode=False,
+        show_tool_calls=False,
+    )
+
+
+async def run_summary(prompt: str, tools: bool = False) -> str:
+    with llm_call("groq", SUMMARY_MODEL) as call:
+        response = await new_summary_agent(tools).arun(prompt)
+        metrics = response.metrics or {}
+        call.usage(sum(metrics.get("input_tokens", [])), sum(metrics.get("output_tokens", [])))
+    return response.content
+
+
+def cached_summary(canonical: str) -> Optional[str]:
+    content_hash = article_hashes.get(canonical)
+    return summary_cache.get((canonical, content_hash)) if content_hash is not None else None
+
+
+async def summarize_url(url: str) -> str:
+    """Summary of the article at ``url``, reused while the article's content is unchanged."""
+    canonical = canonical_url(url)
+    summary = cached_summary(canonical)
+    if summary is not None:
+        SUMMARY_CACHE_REQUESTS.labels("hit").inc()
+        return summary
+    return await summary_flight.do(canonical, lambda: _summarize(canonical, url))
+
+
+async def _summarize(canonical: str, url: str) -> str:
+    async with summary_workers:
+        article = await asyncio.to_thread(fetch_article, url)
+        if article is None:
+            # Let the agent try the page with its own reader; without content there is nothing to key on
+            content_hash = ""
+        else:
+            title, text = article
+            content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        article_hashes[canonical] = content_hash
+
+        summary = summary_cache.get((canonical, content_hash))
+        if summary is not None:
+            SUMMARY_CACHE_REQUESTS.labels("hit").inc()
+            return summary
+        SUMMARY_CACHE_REQUESTS.labels("miss").inc()
+
+        if article is None:
+            summary = await run_summary(f"Summarize {url}", tools=True)
+        else:
+            summary = await run_summary(
+                f"Summarize the following news article.\n\nTitle: {title}\n\n{text[:SUMMARY_MAX_ARTICLE_CHARS]}"
+            )
+        summary_cache[(canonical, content_hash)] = summary
+        return summary
 
 # FastAPI POST route
 @web_search_router.post("/summarize")
 async def summarize_article(request: SummaryRequest):
     try:
-        response = agent.run(f"Summarize {request.url}")
-        return {"summary": response.content}
+        return {"summary": await summarize_url(request.url)}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@web_search_router.post("/summarize/batch")
+async def summarize_articles(request: BatchSummaryRequest):
+    """Summarize several URLs concurrently; a failed URL reports its error without failing the batch."""
+    urls = list(dict.fromkeys(url.strip() for url in request.urls if url.strip()))
+    if not urls:
+        raise HTTPException(status_code=400, detail="At least one URL is required")
+    if len(urls) > SUMMARY_BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {SUMMARY_BATCH_MAX_URLS} URLs per batch")
+
+    summaries = await asyncio.gather(*(summarize_url(url) for url in urls), return_exceptions=True)
+    results = []
+    for url, summary in zip(urls, summaries):
+        if isinstance(summary, Exception):
+            results.append({"url": url, "error": str(summary) or type(summary).__name__})
+        else:
+            results.append({"url": url, "summary": summary})
+    return {"results": results}
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from src.metrics import SINGLE_FLIGHT_REQUESTS
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Shares one in-flight call between concurrent callers asking for the same key.
+
+    The first caller for a key starts the call; callers arriving before it
+    finishes await the same result or exception. Nothing is kept once the call
+    completes, so this coalesces duplicate work without caching it. A caller
+    that is cancelled does not cancel the shared call for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            SINGLE_FLIGHT_REQUESTS.labels(self.name, "leader").inc()
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            SINGLE_FLIGHT_REQUESTS.labels(self.name, "coalesced").inc()
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved in case every caller went away
+            task.exception()
@@ -0,0 +1,7 @@
+import json
+
+
+def format_sse(data: dict, event: str = None) -> str:
+    """Encode a payload as a single Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, default=str)}\n\n"